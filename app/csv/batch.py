@@ -0,0 +1,161 @@
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from io import BytesIO
+from pathlib import PurePath
+from zipfile import BadZipFile, ZipFile, is_zipfile
+
+import pandas as pd
+
+from app.csv.csv import read_file, get_payroll_period, clean, clean_anomalies
+from app.csv.preflight import preflight, MAX_UPLOAD_BYTES
+
+# Limit on the total size of the files of one batch, after expanding archives
+MAX_BATCH_BYTES = 10 * MAX_UPLOAD_BYTES
+
+
+@dataclass
+class FileResult:
+    """
+    Outcome of parsing a single file of a batch.
+    """
+
+    filename: str
+    payroll_period: tuple[datetime, datetime] | None = None
+    size: int = 0
+    error: str | None = None
+    df: pd.DataFrame | None = field(default=None, repr=False)
+
+
+@dataclass
+class BatchResult:
+    """
+    Consolidated outcome of a batch: the merged DataFrame plus per-file stats.
+    """
+
+    files: list[FileResult]
+    payroll_period: tuple[datetime, datetime] | None = None
+    df: pd.DataFrame | None = field(default=None, repr=False)
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return 0 if self.df is None else len(self.df)
+
+
+def make_pool(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    Creates the process pool used by parse_batch().
+    Workers are spawned rather than forked, as the server process is multi-threaded.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def expand_archives(
+    files: list[tuple[str, bytes]]
+) -> tuple[list[tuple[str, bytes]], list[FileResult]]:
+    """
+    Replaces every zip archive in the list with the .csv files it contains.
+    Non-zip entries are passed through untouched.
+    Members are size checked before they are decompressed: oversized members
+    are returned as rejected results instead.
+    """
+    expanded, rejected = [], []
+    total = 0
+    for filename, data in files:
+        if not is_zipfile(BytesIO(data)):
+            expanded.append((filename, data))
+            total += len(data)
+            continue
+        try:
+            with ZipFile(BytesIO(data)) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".csv"):
+                        continue
+                    # Prefix with the archive name so members stay traceable
+                    member = f"{filename}/{PurePath(info.filename).name}"
+                    # Reading a member stops at its declared file_size
+                    if info.file_size > MAX_UPLOAD_BYTES:
+                        error = f"Upload is {info.file_size} bytes, limit is {MAX_UPLOAD_BYTES}"
+                    elif total + info.file_size > MAX_BATCH_BYTES:
+                        error = f"Batch exceeds {MAX_BATCH_BYTES} bytes"
+                    else:
+                        expanded.append((member, archive.read(info)))
+                        total += info.file_size
+                        continue
+                    rejected.append(
+                        FileResult(filename=member, error=f"UploadTooLarge: {error}")
+                    )
+        except BadZipFile:
+            expanded.append((filename, data))
+            total += len(data)
+    return expanded, rejected
+
+
+def parse_file(filename: str, data: bytes) -> FileResult:
+    """
+    Reads, cleans and extracts the payroll period of a single file.
+    Runs inside a worker process, so it must stay a module level function.
+    """
+    try:
+        preflight(BytesIO(data))
+        df = clean(read_file(BytesIO(data)))
+        payroll_period = get_payroll_period(BytesIO(data))
+    except Exception as e:
+        return FileResult(filename=filename, error=f"{type(e).__name__}: {e}")
+    return FileResult(
+        filename=filename, payroll_period=payroll_period, size=len(df), df=df
+    )
+
+
+def parse_batch(
+    files: list[tuple[str, bytes]], pool: Executor | None = None
+) -> BatchResult:
+    """
+    Parses every file of a batch in parallel across a process pool,
+    then merges the results into a single DataFrame.
+    All files must share the same payroll period.
+    The server passes its long-lived pool (see app.main), otherwise one is created per call.
+    """
+    files, rejected = expand_archives(files)
+    if not files and not rejected:
+        return BatchResult(files=[], errors=["No files to parse"])
+
+    if len(files) <= 1:
+        # A pool is pure overhead for a single file
+        results = [parse_file(*file) for file in files]
+    elif pool is None:
+        with make_pool() as pool:
+            results = list(pool.map(parse_file, *zip(*files)))
+    else:
+        results = list(pool.map(parse_file, *zip(*files)))
+    results += rejected
+
+    batch = BatchResult(files=results)
+    batch.errors = [f"{r.filename}: {r.error}" for r in results if r.error]
+
+    parsed = [r for r in results if r.error is None]
+    periods = {r.payroll_period for r in parsed}
+    if len(periods) > 1:
+        batch.errors.append(
+            "Payroll period mismatch: "
+            + ", ".join(f"{r.filename} ({_format_period(r)})" for r in parsed)
+        )
+    elif periods:
+        batch.payroll_period = periods.pop()
+
+    # A batch spanning several periods is rejected as a whole, so nothing is merged
+    if parsed and batch.payroll_period is not None:
+        merged = pd.concat([r.df for r in parsed], ignore_index=True)
+        # Files were checked one by one. Shifts of one employee can overlap across
+        # location exports, so the anomaly checks run again on the merged frame.
+        batch.df = clean_anomalies(merged)
+    return batch
+
+
+def _format_period(result: FileResult) -> str:
+    start, end = result.payroll_period
+    return f"{start:%m/%d/%Y} To {end:%m/%d/%Y}"
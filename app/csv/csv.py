@@ -1,14 +1,89 @@
+import csv
+import mmap
 from datetime import datetime
 from decimal import Decimal
+from io import BytesIO
+from itertools import islice
+from os import PathLike
 from typing import BinaryIO
 
 import pandas as pd
 
 
-def read_file(file: BinaryIO, header: int = 3) -> pd.DataFrame:
+def read_file(file: BinaryIO, header: int = 3, engine: str = "c") -> pd.DataFrame:
+    """
+    Reads a timesheet export into a DataFrame.
+    engine="c" uses the default pandas parser, engine="pyarrow" uses read_file_arrow().
+    """
+    if engine == "pyarrow":
+        return read_file_arrow(file, header=header)
     return pd.read_csv(file, header=header)
 
 
+def _arrow_buffer(file: BinaryIO):
+    """
+    Exposes the contents of a file as a pyarrow Buffer, without copying where possible.
+    Paths and rolled-over SpooledTemporaryFiles are memory-mapped,
+    in-memory buffers are wrapped directly.
+    """
+    import pyarrow as pa
+
+    if isinstance(file, (str, PathLike)):
+        return pa.memory_map(str(file)).read_buffer()
+
+    # UploadFile.file is a SpooledTemporaryFile: a BytesIO until it rolls over,
+    # a real temporary file afterwards. Both are reachable through ._file.
+    inner = getattr(file, "_file", file)
+    position = file.tell()
+    if isinstance(inner, BytesIO):
+        return pa.py_buffer(inner.getbuffer()).slice(position)
+    try:
+        inner.flush()
+        mapped = mmap.mmap(inner.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        # Not backed by a mappable file descriptor (or empty), so fall back to a copy
+        return pa.py_buffer(file.read())
+    return pa.py_buffer(mapped).slice(position)
+
+
+def _header_names(prefix: bytes, header: int) -> list[str]:
+    """
+    Parses the column names from the header row, given the first bytes of the file.
+    """
+    rows = csv.reader(prefix.decode("utf-8", "replace").splitlines())
+    return next(islice(rows, header, None))
+
+
+def read_file_arrow(file: BinaryIO, header: int = 3) -> pd.DataFrame:
+    """
+    Reads a timesheet export with the multithreaded pyarrow CSV reader.
+    All columns are read as Arrow-backed strings: the exports repeat their header row
+    and mix formats within columns, so type inference is left to clean_types().
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    buffer = _arrow_buffer(file)
+    try:
+        # The header sits within the first few lines, so only a small prefix is copied
+        prefix = buffer.slice(0, min(64 * 1024, buffer.size)).to_pybytes()
+        names = _header_names(prefix, header)
+        table = pa_csv.read_csv(
+            pa.BufferReader(buffer),
+            read_options=pa_csv.ReadOptions(skip_rows=header, use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={name: pa.string() for name in names},
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=True,
+            ),
+        )
+    finally:
+        # The buffer may export the upload's in-memory spool, which cannot be
+        # closed while the export is alive. Drop it, even when parsing fails.
+        del buffer
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
 def get_payroll_period(file: BinaryIO) -> tuple[datetime, datetime]:
     df = read_file(file, header=0)
     payroll_strings = df.iat[0, 1].split(" To ")
@@ -72,11 +147,13 @@ def clean_empty_shifts(df: pd.DataFrame) -> pd.DataFrame:
 def to_int(x, placeholder: int = 9999) -> int:
     try:
         return int(x)
-    except ValueError:
+    except (TypeError, ValueError):
         return placeholder
 
 
 def to_str(x, placeholder: str = "") -> str:
+    if x is None or x is pd.NA or (isinstance(x, float) and pd.isna(x)):
+        return placeholder
     try:
         return str(x)
     except ValueError:
@@ -85,15 +162,18 @@ def to_str(x, placeholder: str = "") -> str:
 
 def to_datetime(x: str) -> datetime | None:
     try:
-        return datetime.strptime(x, "%m %B %Y%I:%M%p")
+        # Date and time columns are concatenated as-is, e.g. "February 15 20225:45am"
+        return datetime.strptime(x, "%B %d %Y%I:%M%p")
     except ValueError:
         return None
 
 
-def to_currency(x: str) -> int:
+def to_currency(x) -> int:
+    # Columns without a "$" are read as numbers when no repeated header row makes them text
+    x = to_str(x)
     try:
         return int(Decimal(x.strip().strip("$").strip(",")) * 1000)
-    except ValueError:
+    except (ArithmeticError, ValueError):
         return 0
 
 
@@ -160,3 +240,99 @@ def clean_types(df: pd.DataFrame) -> pd.DataFrame:
     df["Break paid"] = df["Break type"].apply(to_bool).astype("bool")
 
     return df
+
+
+# Thresholds used by clean_anomalies()
+LONG_SHIFT = pd.Timedelta(hours=6)
+MAX_SCHEDULE_DELTA = 1.0  # hours
+
+# Columns added by clean_anomalies(), one boolean flag per check
+ANOMALIES = [
+    "Overlapping shift",
+    "Clock out before clock in",
+    "Break outside shift",
+    "Missing break",
+    "Schedule delta",
+    "Reported issue",
+]
+
+
+@cleaner
+def clean_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Flags shifts that need payroll review. Adds a boolean column per check (see ANOMALIES),
+    and an "Anomalies" column counting the flags raised for each shift.
+    """
+    clock_in = df["Clock in datetime"]
+    clock_out = df["Clock out datetime"]
+    break_start = df["Break start"]
+    break_end = df["Break end"]
+
+    # Overlaps are found on shifts sorted by employee, then clock in time.
+    # A shift overlaps if it starts before the latest clock out of the same employee so far.
+    shifts = df[["Payroll ID", "Clock in datetime", "Clock out datetime"]].sort_values(
+        ["Payroll ID", "Clock in datetime"], kind="stable"
+    )
+    payroll_id = shifts["Payroll ID"]
+    same_employee = payroll_id.eq(payroll_id.shift())
+    latest_out = (
+        shifts["Clock out datetime"].groupby(payroll_id).cummax().shift()
+    ).where(same_employee)
+    starts_early = shifts["Clock in datetime"] < latest_out
+    # Also flag the shift that is overlapped, so both sides show up in review
+    overlapped = starts_early.shift(-1, fill_value=False)
+    df["Overlapping shift"] = (starts_early | overlapped).reindex(df.index)
+
+    df["Clock out before clock in"] = clock_out < clock_in
+
+    df["Break outside shift"] = (
+        (break_start < clock_in) | (break_end > clock_out) | (break_end < break_start)
+    )
+
+    df["Missing break"] = (clock_out - clock_in > LONG_SHIFT) & break_start.isna()
+
+    actual_vs_scheduled = pd.to_numeric(df["Actual vs. Scheduled"], errors="coerce")
+    df["Schedule delta"] = (df["Scheduled"] > 0) & (
+        actual_vs_scheduled.abs() > MAX_SCHEDULE_DELTA
+    )
+
+    df["Reported issue"] = ~df["Issues"].isin(["", "-"])
+
+    df[ANOMALIES] = df[ANOMALIES].fillna(False).astype("bool")
+    df["Anomalies"] = df[ANOMALIES].sum(axis=1).astype("int64")
+    return df
+
+
+def anomaly_report(df: pd.DataFrame) -> dict:
+    """
+    Summarizes the flags of clean_anomalies() for payroll review:
+    the number of shifts raising each check, and the flagged shifts themselves.
+    """
+    def timestamp(value) -> datetime | None:
+        return None if pd.isna(value) else value.to_pydatetime()
+
+    flagged = df[df["Anomalies"] > 0]
+    shifts = [
+        {
+            "name": row["Name"],
+            "payroll_id": int(row["Payroll ID"]),
+            "role": row["Role"],
+            "clock_in": timestamp(row["Clock in datetime"]),
+            "clock_out": timestamp(row["Clock out datetime"]),
+            "anomalies": [check for check in ANOMALIES if row[check]],
+        }
+        for _, row in flagged.iterrows()
+    ]
+    return {
+        "counts": {check: int(df[check].sum()) for check in ANOMALIES},
+        "shifts": shifts,
+    }
+
+
+def clean(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Runs every registered cleaning function over the DataFrame, in order.
+    """
+    for func in CLEANING_FUNCTIONS:
+        df = func(df)
+    return df
@@ -0,0 +1,136 @@
+import csv
+import re
+from typing import BinaryIO
+
+# Configurable limits for a single upload
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_UPLOAD_ROWS = 100_000
+
+# The preamble (banner, payroll period, blank row) is followed by the header row
+HEADER_ROW = 3
+# No line of the preamble or header comes close to this
+MAX_LINE_BYTES = 4 * 1024
+CHUNK_BYTES = 64 * 1024
+
+BANNER = "Village Roaster"
+PAYROLL_PERIOD = re.compile(r"\d{2}/\d{2}/\d{4} To \d{2}/\d{2}/\d{4}")
+# The columns read by clean_types(). Their order differs between exports.
+COLUMNS = frozenset(
+    {
+        "Name",
+        "Clock in date",
+        "Clock in time",
+        "Clock out date",
+        "Clock out time",
+        "Break start",
+        "Break end",
+        "Break length",
+        "Break type",
+        "Payroll ID",
+        "Role",
+        "Wage",
+        "Issues",
+        "Scheduled",
+        "Actual vs. Scheduled",
+        "Total Paid",
+        "Regular",
+        "Unpaid Breaks",
+        "Est. Overtime",
+        "Est. Wages",
+        "Cash Tips",
+        "No Show Reason",
+        "Employee Note",
+        "Manager Note",
+    }
+)
+
+
+class UploadRejected(ValueError):
+    """
+    Raised when an upload is not a Village Roaster timesheet export.
+    """
+
+
+class UploadTooLarge(UploadRejected):
+    """
+    Raised when an upload exceeds MAX_UPLOAD_BYTES or MAX_UPLOAD_ROWS.
+    """
+
+
+def preflight(
+    file: BinaryIO,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    max_rows: int = MAX_UPLOAD_ROWS,
+) -> None:
+    """
+    Validates an upload before it is parsed, raising UploadRejected if it is not a timesheet export.
+    Only the first few lines are parsed, the rest is streamed to enforce the size limits.
+    The file is rewound to where it started afterwards.
+    """
+    start = file.tell()
+    try:
+        # Cheap size check first, for files that know their size
+        if file.seekable():
+            size = file.seek(0, 2) - start
+            file.seek(start)
+            if size > max_bytes:
+                raise UploadTooLarge(f"Upload is {size} bytes, limit is {max_bytes}")
+
+        rows = _read_rows(file, HEADER_ROW + 1)
+        _check_preamble(rows)
+        _check_header(rows[HEADER_ROW])
+        _check_limits(file, max_bytes, max_rows, read=file.tell() - start)
+    finally:
+        file.seek(start)
+
+
+def _read_rows(file: BinaryIO, count: int) -> list[list[str]]:
+    """
+    Reads and parses the first `count` lines of the file.
+    """
+    lines = []
+    for _ in range(count):
+        line = file.readline(MAX_LINE_BYTES)
+        if not line:
+            raise UploadRejected("Upload is truncated: missing header rows")
+        if not line.endswith(b"\n") and len(line) == MAX_LINE_BYTES:
+            raise UploadRejected("Upload is not a CSV file: line too long")
+        try:
+            lines.append(line.decode("utf-8-sig"))
+        except UnicodeDecodeError:
+            raise UploadRejected("Upload is not a CSV file: not UTF-8 text")
+    return list(csv.reader(lines))
+
+
+def _check_preamble(rows: list[list[str]]) -> None:
+    if not rows[0] or rows[0][0] != BANNER:
+        raise UploadRejected(f'Upload is not a timesheet export: missing "{BANNER}" banner')
+    if (
+        len(rows[1]) < 2
+        or rows[1][0] != "Payroll Period"
+        or not PAYROLL_PERIOD.fullmatch(rows[1][1])
+    ):
+        raise UploadRejected("Upload is not a timesheet export: missing payroll period")
+
+
+def _check_header(header: list[str]) -> None:
+    if len(header) != len(COLUMNS) or set(header) != COLUMNS:
+        missing = sorted(COLUMNS - set(header))
+        unexpected = sorted(set(header) - COLUMNS)
+        raise UploadRejected(
+            f"Unexpected timesheet columns: missing {missing}, unexpected {unexpected}"
+        )
+
+
+def _check_limits(file: BinaryIO, max_bytes: int, max_rows: int, read: int) -> None:
+    """
+    Streams the rest of the file in chunks, counting bytes and lines without parsing them.
+    """
+    rows = HEADER_ROW + 1
+    while chunk := file.read(CHUNK_BYTES):
+        read += len(chunk)
+        rows += chunk.count(b"\n")
+        if read > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        if rows > max_rows:
+            raise UploadTooLarge(f"Upload exceeds {max_rows} rows")
@@ -0,0 +1,150 @@
+from collections import defaultdict
+from datetime import date
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.database.archive import archived_periods
+from app.database.shifts import get_shifts, relocate_shifts, to_frame
+from app.models.aggregates import PeriodAggregate
+from app.models.shifts import Shift
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+CELL = ["period_start", "location_id", "role", "day"]
+
+
+def get_aggregates(
+    db: Session,
+    period_start: date,
+    location_id: int | None = None,
+    role: str | None = None,
+) -> list[PeriodAggregate]:
+    """
+    Retrieve the aggregate cells of a payroll period, optionally filtered by location and role.
+    """
+    stmt = select(PeriodAggregate).where(PeriodAggregate.period_start == period_start)
+    if location_id is not None:
+        stmt = stmt.where(PeriodAggregate.location_id == location_id)
+    if role is not None:
+        stmt = stmt.where(PeriodAggregate.role == role)
+    return db.execute(stmt).scalars().all()
+
+
+def apply_shifts(db: Session, frame: "pd.DataFrame") -> list[PeriodAggregate]:
+    """
+    Adds a shift DataFrame (see app.database.shifts) onto the aggregate cells it touches.
+    Only the touched cells are read and written. Does NOT commit.
+    """
+    import pandas as pd
+
+    if frame.empty:
+        return []
+
+    frame = frame.assign(day=frame["clock_in"].dt.date)
+    totals = (
+        frame.groupby(CELL, dropna=False)
+        .agg(shifts=("clock_in", "size"), minutes=("minutes", "sum"), wages=("wages", "sum"))
+        .reset_index()
+    )
+
+    # Load every existing cell of the touched periods in a single query
+    periods = totals["period_start"].unique().tolist()
+    stmt = select(PeriodAggregate).where(PeriodAggregate.period_start.in_(periods))
+    cells = {
+        (cell.period_start, cell.location_id, cell.role, cell.day): cell
+        for cell in db.execute(stmt).scalars()
+    }
+
+    touched = []
+    for row in totals.itertuples(index=False):
+        location_id = None if pd.isna(row.location_id) else int(row.location_id)
+        key = (row.period_start, location_id, row.role, row.day)
+        cell = cells.get(key)
+        if cell is None:
+            cell = PeriodAggregate(
+                period_start=row.period_start,
+                location_id=location_id,
+                role=row.role,
+                day=row.day,
+                shifts=0,
+                minutes=0,
+                wages=0,
+            )
+            db.add(cell)
+            cells[key] = cell
+        cell.shifts += int(row.shifts)
+        cell.minutes += int(row.minutes)
+        cell.wages += int(row.wages)
+        touched.append(cell)
+    return touched
+
+
+def reapply_shifts(db: Session, cells: set[tuple[date, str]]) -> int:
+    """
+    Recomputes the aggregate cells of the given (period, role) pairs, after the location
+    their shifts count towards may have changed. The shifts are relocated first,
+    see app.database.shifts.Locations. Does NOT commit. Returns the number of cells written.
+    """
+    by_period = defaultdict(set)
+    for period, role in cells:
+        by_period[period].add(role)
+
+    written = 0
+    for period, roles in by_period.items():
+        db.execute(
+            delete(PeriodAggregate).where(
+                PeriodAggregate.period_start == period, PeriodAggregate.role.in_(roles)
+            )
+        )
+        shifts = get_shifts(db, period, roles=roles)
+        if shifts:
+            written += len(apply_shifts(db, relocate_shifts(db, to_frame(shifts))))
+    return written
+
+
+def rebuild_aggregates(db: Session, period_start: date | None = None) -> int:
+    """
+    Recomputes the aggregate cells of a payroll period (or of every period) from the stored shifts.
+    Used for backfills. Returns the number of cells written.
+    """
+    if period_start is None:
+        live = db.execute(select(Shift.period_start).distinct()).scalars().all()
+        periods = sorted(set(live) | set(archived_periods()))
+    else:
+        periods = [period_start]
+
+    cells = 0
+    for period in periods:
+        db.execute(
+            delete(PeriodAggregate).where(PeriodAggregate.period_start == period)
+        )
+        # Locations are re-derived, as roles may have been created or moved since upload
+        frame = relocate_shifts(db, to_frame(get_shifts(db, period)))
+        cells += len(apply_shifts(db, frame))
+    db.commit()
+    return cells
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.database import SessionLocal
+    from app.main import init_db
+
+    parser = argparse.ArgumentParser(
+        description="Rebuild the period aggregates from stored shifts."
+    )
+    parser.add_argument(
+        "--period", type=date.fromisoformat, help="Period start (YYYY-MM-DD)"
+    )
+    args = parser.parse_args()
+
+    init_db()
+    session = SessionLocal()
+    try:
+        print(f"Rebuilt {rebuild_aggregates(session, args.period)} cells")
+    finally:
+        session.close()
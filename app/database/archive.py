@@ -0,0 +1,182 @@
+import os
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from app.database.database import chunked
+from app.models.shifts import Shift
+
+# Closed payroll periods are moved out of the shifts table into compressed Parquet files:
+#   ARCHIVE_DIR/period_start=YYYY-MM-DD/location_id=N/part-0.parquet
+ARCHIVE_DIR = Path("./archive")
+COMPRESSION = "zstd"
+# Shifts whose role did not match a location
+NO_LOCATION = "none"
+
+
+def _archive_dir(archive_dir: Path | None) -> Path:
+    # Resolved on every call, so the module setting can be changed at runtime
+    return ARCHIVE_DIR if archive_dir is None else archive_dir
+
+
+def _period_dir(period_start: date, archive_dir: Path | None = None) -> Path:
+    return _archive_dir(archive_dir) / f"period_start={period_start.isoformat()}"
+
+
+def _schema():
+    import pyarrow as pa
+
+    timestamp = pa.timestamp("us")
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("period_start", pa.date32()),
+            ("period_end", pa.date32()),
+            ("payroll_id", pa.int64()),
+            ("name", pa.string()),
+            ("employee_id", pa.int64()),
+            ("role", pa.string()),
+            ("location_id", pa.int64()),
+            ("clock_in", timestamp),
+            ("clock_out", timestamp),
+            ("break_start", timestamp),
+            ("break_end", timestamp),
+            ("break_paid", pa.bool_()),
+            ("wage", pa.int64()),
+            ("scheduled", pa.int64()),
+            ("minutes", pa.int64()),
+            ("wages", pa.int64()),
+        ]
+    )
+
+
+def is_archived(period_start: date, archive_dir: Path | None = None) -> bool:
+    """
+    Whether (part of) a payroll period has been archived. A single stat call.
+    """
+    return _period_dir(period_start, archive_dir).is_dir()
+
+
+def archived_periods(archive_dir: Path | None = None) -> list[date]:
+    """
+    Lists the start of every archived payroll period.
+    """
+    root = _archive_dir(archive_dir)
+    if not root.is_dir():
+        return []
+    return sorted(
+        date.fromisoformat(path.name.removeprefix("period_start="))
+        for path in root.glob("period_start=*")
+        if path.is_dir()
+    )
+
+
+def read_archived_shifts(
+    period_start: date,
+    location_id: int | None = None,
+    archive_dir: Path | None = None,
+) -> list[Shift]:
+    """
+    Reads the archived shifts of a payroll period (optionally of one location only).
+    Returns transient Shift objects, so callers cannot tell them apart from live shifts.
+    """
+    import pyarrow.parquet as pq
+
+    period_dir = _period_dir(period_start, archive_dir)
+    pattern = "location_id=*" if location_id is None else f"location_id={location_id}"
+    shifts = []
+    for path in sorted(period_dir.glob(f"{pattern}/*.parquet")):
+        shifts += [Shift(**row) for row in pq.read_table(path).to_pylist()]
+    return shifts
+
+
+def archive_period(
+    db: Session, period_start: date, archive_dir: Path | None = None
+) -> int:
+    """
+    Moves the live shifts of a payroll period to the archive, one file per location.
+    Returns the number of shifts archived.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    stmt = select(Shift).where(Shift.period_start == period_start)
+    shifts = db.execute(stmt).scalars().all()
+    if not shifts:
+        return 0
+
+    by_location: dict[int | None, list[dict]] = {}
+    columns = _schema().names
+    for shift in shifts:
+        row = {column: getattr(shift, column) for column in columns}
+        by_location.setdefault(shift.location_id, []).append(row)
+
+    written = []
+    tmp_path = None
+    try:
+        for location_id, rows in by_location.items():
+            partition = NO_LOCATION if location_id is None else location_id
+            location_dir = _period_dir(period_start, archive_dir) / f"location_id={partition}"
+            location_dir.mkdir(parents=True, exist_ok=True)
+            # Periods can be archived again, if shifts were uploaded after closing
+            path = location_dir / f"part-{len(list(location_dir.glob('*.parquet')))}.parquet"
+            tmp_path = path.with_suffix(".tmp")
+            table = pa.Table.from_pylist(rows, schema=_schema())
+            pq.write_table(table, tmp_path, compression=COMPRESSION)
+            os.replace(tmp_path, path)
+            written.append(path)
+
+        # Only the shifts written above: a late upload may have added more since they were read
+        ids = [shift.id for shift in shifts]
+        for chunk in chunked(ids):
+            db.execute(delete(Shift).where(Shift.id.in_(chunk)))
+        db.commit()
+    except Exception:
+        # The live rows are still there, so the archive must not hold them too
+        db.rollback()
+        for path in written:
+            path.unlink(missing_ok=True)
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+        raise
+    return len(shifts)
+
+
+def archive_closed_periods(
+    db: Session, before: date, archive_dir: Path | None = None
+) -> dict[date, int]:
+    """
+    Archives every payroll period that ended before the given date.
+    Returns the number of shifts archived per period.
+    """
+    stmt = select(Shift.period_start).where(Shift.period_end < before).distinct()
+    periods = db.execute(stmt).scalars().all()
+    return {period: archive_period(db, period, archive_dir) for period in periods}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.database.database import SessionLocal
+    from app.main import init_db
+
+    parser = argparse.ArgumentParser(
+        description="Archive closed payroll periods to Parquet files."
+    )
+    parser.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        default=date.today(),
+        help="Archive periods that ended before this date (YYYY-MM-DD)",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    session = SessionLocal()
+    try:
+        for period, count in archive_closed_periods(session, args.before).items():
+            print(f"Archived {count} shifts of the period starting {period}")
+    finally:
+        session.close()
@@ -14,3 +14,15 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+# SQLite limits the number of parameters of a query (32766 by default),
+# so long IN lists are sent in chunks of at most CHUNK_SIZE parameters
+CHUNK_SIZE = 10_000
+
+
+def chunked(items: list, size: int = CHUNK_SIZE):
+    """
+    Splits a list into consecutive chunks of at most `size` items.
+    """
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
@@ -1,6 +1,8 @@
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.database.name_index import NAME_INDEX
+from app.database.payroll import recompute_for_employee
 from app.models.employees import Employee
 from app.schemas.employees import EmployeeSchema
 
@@ -18,6 +20,7 @@ def make_employee(db: Session, employee_schema: EmployeeSchema):
     db.add(employee)
     db.commit()
     db.refresh(employee)
+    NAME_INDEX.add(employee.id, employee.name)
     return employee
 
 
@@ -26,7 +29,12 @@ def update_employee(db: Session, employee_id: int, employee_schema: EmployeeSche
 
     employee.name = employee_schema.name
     employee.primary_location_id = employee_schema.primary_location_id
+    employee.version += 1
 
+    db.flush()
+    # Only this employee's payroll results are recomputed
+    recompute_for_employee(db, employee_id)
     db.commit()
     db.refresh(employee)
+    NAME_INDEX.add(employee.id, employee.name)
     return employee
@@ -0,0 +1,141 @@
+import unicodedata
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models.employees import Employee
+
+# Matches scoring below this are not trusted, and resolve to no employee
+MIN_SCORE = 0.6
+
+
+class Match(NamedTuple):
+    employee_id: int | None
+    score: float
+
+
+def normalize(name: str) -> str:
+    """
+    Normalizes a name for matching: no accents, no punctuation, lowercase, single spaces.
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c if c.isalnum() else " " for c in name if not unicodedata.combining(c))
+    return " ".join(name.lower().split())
+
+
+def trigrams(key: str) -> set[str]:
+    """
+    Splits a normalized name into its character trigrams, padded so word edges count.
+    """
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    In-memory index of employee names, for matching the free text Name column of timesheets.
+    Exact matches on the normalized name are a dict lookup. Other names are scored
+    against only the employees sharing a trigram with them, via an inverted index.
+
+    Kept current by make_employee() and update_employee(). The index is per process,
+    so employees created or renamed by other workers are picked up on resolve(), by a cheap check
+    of the employee count, highest id and sum of row versions (bumped by every update).
+    """
+
+    def __init__(self):
+        self.keys: dict[str, int] = {}
+        self.names: dict[int, str] = {}
+        self.grams: dict[int, set[str]] = {}
+        self.postings: defaultdict[str, set[int]] = defaultdict(set)
+        self.state: tuple[int, int | None, int] | None = None
+
+    def clear(self):
+        self.keys.clear()
+        self.names.clear()
+        self.grams.clear()
+        self.postings.clear()
+        self.state = None
+
+    def add(self, employee_id: int, name: str):
+        """
+        Adds an employee to the index, replacing any previous name.
+        """
+        if self.state is not None:
+            # Track this process's own change, so load() does not see the table as changed:
+            # a new employee, or an update which bumped the employee's version
+            count, max_id, versions = self.state
+            if employee_id in self.names:
+                self.state = (count, max_id, versions + 1)
+            else:
+                self.state = (count + 1, max(max_id or 0, employee_id), versions)
+        self.remove(employee_id)
+        key = normalize(name)
+        self.keys[key] = employee_id
+        self.names[employee_id] = key
+        self.grams[employee_id] = trigrams(key)
+        for gram in self.grams[employee_id]:
+            self.postings[gram].add(employee_id)
+
+    def remove(self, employee_id: int):
+        key = self.names.pop(employee_id, None)
+        if key is None:
+            return
+        if self.keys.get(key) == employee_id:
+            del self.keys[key]
+        for gram in self.grams.pop(employee_id):
+            self.postings[gram].discard(employee_id)
+
+    def load(self, db: Session):
+        """
+        (Re)builds the index from the employees table, if it changed since it was last loaded.
+        """
+        stmt = select(
+            func.count(Employee.id),
+            func.max(Employee.id),
+            func.coalesce(func.sum(Employee.version), 0),
+        )
+        state = tuple(db.execute(stmt).one())
+        if state == self.state:
+            return
+        self.clear()
+        for employee_id, name in db.execute(select(Employee.id, Employee.name)):
+            self.add(employee_id, name)
+        self.state = state
+
+    def match(self, name: str) -> Match:
+        """
+        Finds the employee best matching a name, scored by trigram similarity (Dice coefficient).
+        """
+        key = normalize(name)
+        if key in self.keys:
+            return Match(self.keys[key], 1.0)
+
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        if not shared:
+            return Match(None, 0.0)
+
+        employee_id, score = max(
+            (
+                (candidate, 2 * count / (len(grams) + len(self.grams[candidate])))
+                for candidate, count in shared.items()
+            ),
+            key=lambda item: item[1],
+        )
+        if score < MIN_SCORE:
+            return Match(None, score)
+        return Match(employee_id, score)
+
+    def resolve(self, db: Session, names) -> dict[str, Match]:
+        """
+        Matches every distinct name of an upload in one batch.
+        """
+        self.load(db)
+        return {name: self.match(name) for name in set(names)}
+
+
+NAME_INDEX = NameIndex()
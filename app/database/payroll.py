@@ -0,0 +1,131 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.database.aggregates import reapply_shifts
+from app.database.archive import archived_periods
+from app.database.database import CHUNK_SIZE, chunked
+from app.database.shifts import Locations, get_shifts
+from app.models.payroll import PayrollDependency, PayrollTotal
+from app.models.shifts import Shift
+
+# Payroll totals are computed per (period, employee). When reference data changes,
+# only the results that depend on it (see PayrollDependency) are recomputed.
+
+
+def get_payroll_totals(
+    db: Session, period_start: date, employee_id: int | None = None
+) -> list[PayrollTotal]:
+    """
+    Retrieve the payroll totals of a period, optionally of one employee only.
+    """
+    stmt = select(PayrollTotal).where(PayrollTotal.period_start == period_start)
+    if employee_id is not None:
+        stmt = stmt.where(PayrollTotal.employee_id == employee_id)
+    return db.execute(stmt).scalars().all()
+
+
+def recompute_totals(db: Session, results: set[tuple[date, int]]) -> int:
+    """
+    Recomputes the totals of the given (period, employee) results, and their dependencies.
+    Shifts count towards their location as decided by app.database.shifts.Locations.
+    Does NOT commit. Returns the number of totals written.
+    """
+    results = {(period, employee_id) for period, employee_id in results if employee_id}
+    if not results:
+        return 0
+
+    locations = Locations(db)
+
+    # Each result takes two parameters
+    for chunk in chunked(list(results), CHUNK_SIZE // 2):
+        for table in (PayrollTotal, PayrollDependency):
+            db.execute(
+                delete(table).where(tuple_(table.period_start, table.employee_id).in_(chunk))
+            )
+
+    by_period = defaultdict(set)
+    for period, employee_id in results:
+        by_period[period].add(employee_id)
+
+    written = 0
+    for period, employee_ids in by_period.items():
+        totals = {}
+        dependencies = set()
+        for shift in get_shifts(db, period, employee_ids):
+            location_id = locations.locate(shift.role, shift.employee_id)
+            key = (shift.employee_id, location_id)
+            total = totals.setdefault(key, [0, 0, 0])
+            total[0] += 1
+            total[1] += shift.minutes
+            total[2] += shift.wages
+            dependencies.add((shift.employee_id, shift.role))
+
+        db.add_all(
+            PayrollTotal(
+                period_start=period,
+                employee_id=employee_id,
+                location_id=location_id,
+                shifts=shifts,
+                minutes=minutes,
+                wages=wages,
+            )
+            for (employee_id, location_id), (shifts, minutes, wages) in totals.items()
+        )
+        db.add_all(
+            PayrollDependency(period_start=period, employee_id=employee_id, role=role)
+            for employee_id, role in dependencies
+        )
+        written += len(totals)
+    db.flush()
+    return written
+
+
+def recompute_for_roles(db: Session, roles: set[str]) -> int:
+    """
+    Recomputes the results that used any of the given role names, after a role was created
+    or changed. The shifts of those roles are relocated and their aggregate cells re-applied too,
+    including shifts of unmatched names, which have no results. Does NOT commit.
+    """
+    stmt = select(Shift.period_start).where(Shift.role.in_(roles)).distinct()
+    periods = set(db.execute(stmt).scalars()) | set(archived_periods())
+    reapply_shifts(db, {(period, role) for period in periods for role in roles})
+
+    stmt = select(PayrollDependency.period_start, PayrollDependency.employee_id).where(
+        PayrollDependency.role.in_(roles)
+    )
+    return recompute_totals(db, {tuple(row) for row in db.execute(stmt)})
+
+
+def recompute_for_employee(db: Session, employee_id: int) -> int:
+    """
+    Recomputes every result of an employee, after the employee was changed.
+    Shifts whose role has no location count towards the employee's primary location,
+    so those are relocated and their aggregate cells re-applied too. Does NOT commit.
+    """
+    stmt = select(PayrollDependency.period_start, PayrollDependency.role).where(
+        PayrollDependency.employee_id == employee_id
+    )
+    dependencies = db.execute(stmt).all()
+    located = Locations(db).roles
+    reapply_shifts(
+        db, {(period, role) for period, role in dependencies if role not in located}
+    )
+    return recompute_totals(db, {(period, employee_id) for period, _ in dependencies})
+
+
+def recompute_period(db: Session, period_start: date) -> int:
+    """
+    Recomputes every result of a period from its shifts. Used for backfills.
+    """
+    employee_ids = {
+        shift.employee_id for shift in get_shifts(db, period_start) if shift.employee_id
+    }
+    db.execute(delete(PayrollTotal).where(PayrollTotal.period_start == period_start))
+    written = recompute_totals(
+        db, {(period_start, employee_id) for employee_id in employee_ids}
+    )
+    db.commit()
+    return written
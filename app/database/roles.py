@@ -1,6 +1,7 @@
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from app.database.payroll import recompute_for_roles
 from app.models.roles import Role
 from app.schemas.roles import RoleSchema
 
@@ -18,6 +19,9 @@ def get_roles(db: Session):
 def make_role(db: Session, role_schema: RoleSchema):
     role = Role(**role_schema.dict())
     db.add(role)
+    db.flush()
+    # Shifts may already refer to this role by name
+    recompute_for_roles(db, {role.name})
     db.commit()
     db.refresh(role)
     return role
@@ -25,8 +29,12 @@ def make_role(db: Session, role_schema: RoleSchema):
 
 def update_role(db: Session, role_id: int, role_schema: RoleSchema):
     role = get_role(db, role_id)
+    old_name = role.name
     role.name = role_schema.name
     role.location_id = role_schema.location_id
+    db.flush()
+    # Only the payroll results that used this role (under either name) are recomputed
+    recompute_for_roles(db, {old_name, role.name})
     db.commit()
     db.refresh(role)
     return role
@@ -0,0 +1,229 @@
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.database.archive import is_archived, read_archived_shifts
+from app.database.database import CHUNK_SIZE, chunked
+from app.models.employees import Employee
+from app.models.roles import Role
+from app.models.shifts import Shift
+
+# pandas is only imported when shifts are converted to/from DataFrames,
+# so that the read-only routes do not pay for it at startup.
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Maps cleaned DataFrame columns (see app.csv.csv.clean_types) to Shift columns
+COLUMNS = {
+    "Payroll ID": "payroll_id",
+    "Name": "name",
+    "Role": "role",
+    "Clock in datetime": "clock_in",
+    "Clock out datetime": "clock_out",
+    "Break start": "break_start",
+    "Break end": "break_end",
+    "Break paid": "break_paid",
+    "Wage": "wage",
+    "Scheduled": "scheduled",
+}
+
+
+def get_shifts(
+    db: Session,
+    period_start: date,
+    employee_ids: set[int] | None = None,
+    roles: set[str] | None = None,
+) -> list[Shift]:
+    """
+    Retrieve all shifts of a payroll period (optionally of some employees or roles only),
+    from the live table and the archive. The location of archived shifts is re-derived.
+    """
+    stmt = select(Shift).where(Shift.period_start == period_start)
+    if roles is not None:
+        stmt = stmt.where(Shift.role.in_(roles))
+    if employee_ids is None:
+        shifts = db.execute(stmt).scalars().all()
+    else:
+        shifts = []
+        for chunk in chunked(list(employee_ids)):
+            chunk_stmt = stmt.where(Shift.employee_id.in_(chunk))
+            shifts += db.execute(chunk_stmt).scalars().all()
+    if is_archived(period_start):
+        archived = read_archived_shifts(period_start)
+        if employee_ids is not None:
+            archived = [shift for shift in archived if shift.employee_id in employee_ids]
+        if roles is not None:
+            archived = [shift for shift in archived if shift.role in roles]
+        # Archived files keep the location of when they were written, which may be stale
+        locations = Locations(db)
+        for shift in archived:
+            shift.location_id = locations.locate(shift.role, shift.employee_id)
+        shifts = archived + shifts
+    return shifts
+
+
+class Locations:
+    """
+    Decides the location a shift counts towards: the location of its role (matched by name),
+    or the employee's primary location if the role has none.
+    Every table derived from shifts uses this one rule, read from the current reference data.
+    """
+
+    def __init__(self, db: Session):
+        stmt = select(Role.name, Role.location_id).where(Role.location_id.is_not(None))
+        self.roles = dict(db.execute(stmt).all())
+        stmt = select(Employee.id, Employee.primary_location_id)
+        self.employees = dict(db.execute(stmt).all())
+
+    def locate(self, role: str, employee_id: int | None = None) -> int | None:
+        if role in self.roles:
+            return self.roles[role]
+        return self.employees.get(employee_id)
+
+    def locate_frame(self, frame: "pd.DataFrame") -> "pd.DataFrame":
+        """
+        Sets the location_id column of a shift DataFrame.
+        """
+        frame["location_id"] = (
+            frame["role"]
+            .map(self.roles)
+            .fillna(frame["employee_id"].map(self.employees))
+            .astype("Int64")
+        )
+        return frame
+
+
+def relocate_shifts(db: Session, frame: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Re-derives the location of the shifts of a DataFrame from the current reference data,
+    and writes changed locations back to the live shifts table. Does NOT commit.
+    Returns the frame with the new locations. Archived shifts keep their partition,
+    their location is re-derived whenever they are read, see get_shifts().
+    """
+    # -1 is never a location id, so shifts without a location compare equal
+    previous = frame["location_id"].astype("Int64").fillna(-1)
+    frame = Locations(db).locate_frame(frame.copy())
+    changed = frame[previous != frame["location_id"].fillna(-1)]
+    if changed.empty:
+        return frame
+
+    # Live shifts are matched by period too, as databases created before shift ids were
+    # never reused may hold a live shift with the same id as an archived one
+    live = set()
+    for chunk in chunked([int(i) for i in changed["id"]]):
+        stmt = select(Shift.id, Shift.period_start).where(Shift.id.in_(chunk))
+        live |= {tuple(row) for row in db.execute(stmt)}
+    db.bulk_update_mappings(
+        Shift,
+        [
+            {"id": record["id"], "location_id": record["location_id"]}
+            for record in to_records(changed[["id", "period_start", "location_id"]])
+            if (record["id"], record["period_start"]) in live
+        ],
+    )
+    return frame
+
+
+def add_totals(frame: "pd.DataFrame") -> "pd.DataFrame":
+    """
+    Adds the worked minutes (excluding unpaid breaks) and the wages they earn.
+    """
+    import pandas as pd
+
+    unpaid_break = (frame["break_end"] - frame["break_start"]).where(
+        ~frame["break_paid"].astype(bool)
+    )
+    unpaid_break = unpaid_break.fillna(pd.Timedelta(0)).clip(lower=pd.Timedelta(0))
+    worked = (frame["clock_out"] - frame["clock_in"] - unpaid_break).clip(
+        lower=pd.Timedelta(0)
+    )
+    frame["minutes"] = (worked.dt.total_seconds() // 60).astype("int64")
+    frame["wages"] = (frame["wage"] * frame["minutes"] // 60).astype("int64")
+    return frame
+
+
+def to_shift_frame(
+    db: Session,
+    df: "pd.DataFrame",
+    payroll_period: tuple[datetime, datetime],
+    employee_ids: dict[str, int | None] | None = None,
+) -> "pd.DataFrame":
+    """
+    Converts a cleaned DataFrame into rows of the shifts table.
+    Shifts without both a clock in and clock out time cannot be paid, so are dropped.
+    employee_ids maps timesheet names to employees, see app.database.name_index.
+    """
+    frame = df[list(COLUMNS)].rename(columns=COLUMNS)
+    frame = frame[frame["clock_in"].notna() & frame["clock_out"].notna()]
+    frame = frame.drop_duplicates(subset=["payroll_id", "clock_in"])
+
+    start, end = payroll_period
+    frame = frame.assign(period_start=start.date(), period_end=end.date())
+
+    frame["employee_id"] = frame["name"].map(employee_ids or {}).astype("Int64")
+    frame = Locations(db).locate_frame(frame)
+    return add_totals(frame)
+
+
+def store_shifts(
+    db: Session,
+    df: "pd.DataFrame",
+    payroll_period: tuple[datetime, datetime],
+    employee_ids: dict[str, int | None] | None = None,
+) -> "pd.DataFrame":
+    """
+    Adds the shifts of a cleaned DataFrame to the session, skipping shifts that are already stored.
+    Does NOT commit. Returns the rows that were added.
+    """
+    frame = to_shift_frame(db, df, payroll_period, employee_ids)
+    if frame.empty:
+        return frame
+
+    keys = [
+        (int(payroll_id), clock_in.to_pydatetime())
+        for payroll_id, clock_in in zip(frame["payroll_id"], frame["clock_in"])
+    ]
+    existing = set()
+    # Each key takes two parameters
+    for chunk in chunked(keys, CHUNK_SIZE // 2):
+        stmt = select(Shift.payroll_id, Shift.clock_in).where(
+            tuple_(Shift.payroll_id, Shift.clock_in).in_(chunk)
+        )
+        existing |= {tuple(row) for row in db.execute(stmt)}
+    start = payroll_period[0].date()
+    if is_archived(start):
+        # Late uploads for a closed period are checked against the archive too
+        existing |= {
+            (shift.payroll_id, shift.clock_in) for shift in read_archived_shifts(start)
+        }
+    frame = frame[[key not in existing for key in keys]]
+
+    if not frame.empty:
+        db.execute(insert(Shift), to_records(frame))
+    return frame
+
+
+def to_records(frame: "pd.DataFrame") -> list[dict]:
+    """
+    Converts a DataFrame to a list of dicts holding plain Python values (None for missing).
+    """
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).to_dict("records")
+
+
+def to_frame(shifts: list[Shift]) -> "pd.DataFrame":
+    """
+    Converts Shift objects back into a shift DataFrame.
+    """
+    import pandas as pd
+
+    columns = [column.name for column in Shift.__table__.columns]
+    frame = pd.DataFrame(
+        [[getattr(shift, column) for column in columns] for shift in shifts],
+        columns=columns,
+    )
+    for column in ("clock_in", "clock_out", "break_start", "break_end"):
+        frame[column] = pd.to_datetime(frame[column])
+    return frame
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy.orm import Session
+
+from app.database.aggregates import apply_shifts
+from app.database.name_index import NAME_INDEX, Match
+from app.database.payroll import recompute_totals
+from app.database.shifts import store_shifts
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass
+class UploadResult:
+    """
+    Outcome of committing an upload: the number of new shifts,
+    and the employee each timesheet name was matched to.
+    """
+
+    stored: int
+    matches: dict[str, Match]
+
+
+def commit_upload(
+    db: Session, df: "pd.DataFrame", payroll_period: tuple[datetime, datetime]
+) -> UploadResult:
+    """
+    Stores the shifts of a cleaned upload and updates everything derived from them,
+    in a single transaction.
+    """
+    # Every distinct name is matched once, not once per shift
+    matches = NAME_INDEX.resolve(db, df["Name"].dropna().unique())
+    employee_ids = {name: match.employee_id for name, match in matches.items()}
+
+    frame = store_shifts(db, df, payroll_period, employee_ids)
+    apply_shifts(db, frame)
+    # Only the results of employees with new shifts are recomputed
+    results = frame[["period_start", "employee_id"]].dropna().drop_duplicates()
+    recompute_totals(
+        db,
+        {
+            (period_start, int(employee_id))
+            for period_start, employee_id in results.itertuples(index=False)
+        },
+    )
+    db.commit()
+    return UploadResult(stored=len(frame), matches=matches)
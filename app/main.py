@@ -1,21 +1,72 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
 
 from app.database.database import Base, engine
-from app.routers.database import employee, location, role
+from app.routers.database import (
+    aggregate,
+    employee,
+    location,
+    payroll,
+    role,
+    shift,
+)
 from app.routers.upload import upload
 
-app = FastAPI()
+
+# Columns added to existing tables after their release, with their SQLite definition.
+# create_all() only creates missing tables, so init_db() adds these to older databases.
+ADDED_COLUMNS = {
+    ("employees", "version"): "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+def init_db(bind: Engine = engine):
+    """
+    Creates any missing tables and columns. Importing the routers above registers every model
+    with Base.metadata, so command line tools import this module to set up a database too.
+    """
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    with bind.begin() as connection:
+        for (table, column), definition in ADDED_COLUMNS.items():
+            if column not in {c["name"] for c in inspector.get_columns(table)}:
+                connection.execute(
+                    text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Runs once per worker process: database setup on startup, and the process pool
+    shared by batch uploads.
+    """
+    init_db()
+    # Pool workers are only started on the first batch upload
+    app.state.parse_pool = ProcessPoolExecutor(
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    yield
+    app.state.parse_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(location.router)
 app.include_router(employee.router)
 app.include_router(role.router)
+app.include_router(shift.router)
+app.include_router(aggregate.router)
+app.include_router(payroll.router)
 
 app.include_router(upload.router)
 
 
-Base.metadata.create_all(bind=engine)
-
-
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
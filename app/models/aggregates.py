@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, String, func
+
+from app.database.database import Base
+
+
+class PeriodAggregate(Base):
+    __tablename__ = "period_aggregates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_start = Column(Date)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    role = Column(String)
+    day = Column(Date)
+    shifts = Column(Integer, default=0)
+    minutes = Column(Integer, default=0)
+    wages = Column(Integer, default=0)
+
+
+# One row per (period x location x role x day) cell.
+# SQLite treats NULLs as distinct in unique indexes, so cells without a location
+# are keyed on -1 (never a location id) for the index to enforce this.
+Index(
+    "ix_period_aggregates_cell",
+    PeriodAggregate.period_start,
+    func.coalesce(PeriodAggregate.location_id, -1),
+    PeriodAggregate.role,
+    PeriodAggregate.day,
+    unique=True,
+)
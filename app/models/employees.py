@@ -10,5 +10,8 @@ class Employee(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True)
     primary_location_id = Column(Integer, ForeignKey("locations.id"))
+    # Bumped by every update, so other processes can tell a row changed (see NameIndex)
+    # Added after release, see app.main.ADDED_COLUMNS
+    version = Column(Integer, default=0, nullable=False)
 
     primary_location = relationship("Location", back_populates="employees")
@@ -0,0 +1,46 @@
+from sqlalchemy import Column, Date, ForeignKey, Index, Integer, String
+
+from app.database.database import Base
+
+
+class PayrollTotal(Base):
+    __tablename__ = "payroll_totals"
+    # One row per (period x employee x location) result
+    __table_args__ = (
+        Index(
+            "ix_payroll_totals_result",
+            "period_start",
+            "employee_id",
+            "location_id",
+            unique=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_start = Column(Date)
+    employee_id = Column(Integer, ForeignKey("employees.id"), index=True)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    shifts = Column(Integer, default=0)
+    minutes = Column(Integer, default=0)
+    wages = Column(Integer, default=0)
+
+
+class PayrollDependency(Base):
+    __tablename__ = "payroll_dependencies"
+    # Records that the totals of an employee for a period were computed using a role.
+    # Shifts refer to roles by name, so the dependency is on the name,
+    # whether or not a Role with that name exists (yet).
+    __table_args__ = (
+        Index(
+            "ix_payroll_dependencies_result",
+            "period_start",
+            "employee_id",
+            "role",
+            unique=True,
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_start = Column(Date)
+    employee_id = Column(Integer, ForeignKey("employees.id"), index=True)
+    role = Column(String, index=True)
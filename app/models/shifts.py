@@ -0,0 +1,45 @@
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+
+from app.database.database import Base
+
+
+class Shift(Base):
+    __tablename__ = "shifts"
+    # A punch is identified by who clocked in, and when.
+    # This makes re-uploading an export idempotent.
+    # Ids are never reused once archived shifts leave the table (see app.database.archive),
+    # so an archived shift cannot be mistaken for a live one.
+    __table_args__ = (
+        Index("ix_shifts_punch", "payroll_id", "clock_in", unique=True),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_start = Column(Date, index=True)
+    period_end = Column(Date)
+    payroll_id = Column(Integer, index=True)
+    name = Column(String)
+    # Resolved from the name by app.database.name_index, None if no confident match
+    employee_id = Column(Integer, ForeignKey("employees.id"), nullable=True, index=True)
+    role = Column(String)
+    location_id = Column(Integer, ForeignKey("locations.id"), nullable=True)
+    clock_in = Column(DateTime)
+    clock_out = Column(DateTime)
+    break_start = Column(DateTime, nullable=True)
+    break_end = Column(DateTime, nullable=True)
+    break_paid = Column(Boolean, default=False)
+    # Currency is stored in thousandths of a dollar, see to_currency()
+    wage = Column(Integer)
+    scheduled = Column(Integer)
+    # Worked minutes (excluding unpaid breaks) and the wages they earn
+    minutes = Column(Integer)
+    wages = Column(Integer)
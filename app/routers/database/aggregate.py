@@ -0,0 +1,26 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends
+
+from app.database import aggregates as db_agg
+
+from app.dependencies import get_db
+
+router = APIRouter(prefix="/db/aggregates", tags=["aggregates"])
+
+
+# GET Requests
+@router.get("/")
+async def get_aggregates(
+    period_start: date,
+    location_id: int | None = None,
+    role: str | None = None,
+    session=Depends(get_db),
+):
+    return db_agg.get_aggregates(session, period_start, location_id, role)
+
+
+# POST Requests
+@router.post("/rebuild")
+async def rebuild_aggregates(period_start: date | None = None, session=Depends(get_db)):
+    return {"cells": db_agg.rebuild_aggregates(session, period_start)}
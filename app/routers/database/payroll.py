@@ -0,0 +1,23 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends
+
+from app.database import payroll as db_payroll
+
+from app.dependencies import get_db
+
+router = APIRouter(prefix="/db/payroll", tags=["payroll"])
+
+
+# GET Requests
+@router.get("/")
+async def get_payroll_totals(
+    period_start: date, employee_id: int | None = None, session=Depends(get_db)
+):
+    return db_payroll.get_payroll_totals(session, period_start, employee_id)
+
+
+# POST Requests
+@router.post("/recompute")
+async def recompute_period(period_start: date, session=Depends(get_db)):
+    return {"totals": db_payroll.recompute_period(session, period_start)}
@@ -0,0 +1,22 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends
+
+from app.database import archive as db_archive
+from app.database import shifts as db_shift
+
+from app.dependencies import get_db
+
+router = APIRouter(prefix="/db/shifts", tags=["shifts"])
+
+
+# GET Requests
+@router.get("/")
+async def get_shifts(period_start: date, session=Depends(get_db)):
+    return db_shift.get_shifts(session, period_start)
+
+
+# POST Requests
+@router.post("/archive")
+async def archive_shifts(before: date, session=Depends(get_db)):
+    return db_archive.archive_closed_periods(session, before)
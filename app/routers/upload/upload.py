@@ -1,26 +1,111 @@
-from fastapi import APIRouter, UploadFile
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile
 from starlette.concurrency import run_in_threadpool
 
-from app.csv.csv import read_file, get_payroll_period
+from app.dependencies import get_db
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
+# The CSV subsystem pulls in pandas, which dominates startup time.
+# It is imported on first use, so workers only serving /db/* routes never load it.
+
 
 @router.post("/")
-async def upload_file(file: UploadFile):
+async def upload_file(
+    file: UploadFile,
+    engine: Literal["c", "pyarrow"] = "c",
+    session=Depends(get_db),
+):
     """
     Allows client to upload a file to server.
-    Reads the file and payroll period to allow for session creation.
+    Reads and cleans the file, then stores its shifts for the payroll period.
     """
+    from app.csv.preflight import preflight, UploadRejected, UploadTooLarge
+
+    # Reject files that are not timesheet exports before paying for a full parse
+    try:
+        preflight(file.file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    from app.csv.csv import read_file, get_payroll_period, clean, anomaly_report
+    from app.database.uploads import commit_upload
+
     # file.file provides the read_file() function with a file-like object
-    df = read_file(file.file)
+    df = clean(read_file(file.file, engine=engine))
     # File must be re-buffered to be read again
     await file.seek(0)
     # Get payroll period from file
     payroll_period = get_payroll_period(file.file)
+    result = commit_upload(session, df, payroll_period)
     # TEMP: Return a json response
     return {
         "filename": file.filename,
         "payroll_period": payroll_period,
-        "size": len(df)
+        "size": len(df),
+        "stored": result.stored,
+        "employees": {name: match._asdict() for name, match in result.matches.items()},
+        "anomalies": anomaly_report(df),
+    }
+
+
+@router.post("/batch")
+async def upload_batch(
+    request: Request, files: list[UploadFile], session=Depends(get_db)
+):
+    """
+    Allows client to upload many files (or zip archives of files) at once.
+    Files are parsed in parallel and merged into one consolidated result.
+    The batch is only stored if every file parsed and all share one payroll period.
+    """
+    from concurrent.futures.process import BrokenProcessPool
+
+    from app.csv.batch import make_pool, parse_batch
+    from app.csv.csv import anomaly_report
+    from app.database.uploads import commit_upload
+
+    contents = [(file.filename, await file.read()) for file in files]
+    # Parsing is CPU bound, so the process pool is driven from a worker thread
+    # to keep the event loop responsive.
+    for attempt in range(2):
+        pool = getattr(request.app.state, "parse_pool", None)
+        try:
+            batch = await run_in_threadpool(parse_batch, contents, pool)
+            break
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory), which breaks the pool for good.
+            # It is replaced once for all requests, then the batch is retried once.
+            if pool is not None and request.app.state.parse_pool is pool:
+                request.app.state.parse_pool = make_pool()
+                pool.shutdown(wait=False)
+            if attempt:
+                raise HTTPException(
+                    status_code=500,
+                    detail="A worker process died while parsing the batch",
+                )
+    stored, employees = 0, {}
+    if not batch.errors:
+        result = commit_upload(session, batch.df, batch.payroll_period)
+        stored = result.stored
+        employees = {name: match._asdict() for name, match in result.matches.items()}
+    # TEMP: Return a json response
+    return {
+        "payroll_period": batch.payroll_period,
+        "size": batch.size,
+        "stored": stored,
+        "employees": employees,
+        "anomalies": anomaly_report(batch.df) if batch.df is not None else None,
+        "files": [
+            {
+                "filename": result.filename,
+                "payroll_period": result.payroll_period,
+                "size": result.size,
+                "error": result.error,
+            }
+            for result in batch.files
+        ],
+        "errors": batch.errors,
     }
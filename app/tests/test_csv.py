@@ -1,11 +1,17 @@
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
+from zipfile import ZipFile
 
 import pandas as pd
 from pandas import read_csv
 from pytest import fixture
 from pytest import mark
+from pytest import raises
 
+from app.csv import batch as batch_module
+from app.csv.batch import parse_batch
+from app.csv.preflight import preflight, UploadRejected, UploadTooLarge
 from app.csv.csv import (
     get_payroll_period,
     read_file,
@@ -13,6 +19,10 @@ from app.csv.csv import (
     clean_excess_headers,
     clean_empty_shifts,
     clean_types,
+    clean_anomalies,
+    clean,
+    anomaly_report,
+    ANOMALIES,
 )
 
 param = mark.parametrize
@@ -117,3 +127,205 @@ def test_clean_types(df: pd.DataFrame, request):
     assert df["Employee Note"].dtype == "string"
     assert df["Manager Note"].dtype == "string"
     assert df["Break paid"].dtype == "bool"
+
+
+@param("df", [df_1, df_2])
+def test_clean_anomalies(df: pd.DataFrame, request):
+    df = request.getfixturevalue(df.__name__)
+    df = clean_types(clean_empty_shifts(clean_excess_headers(clean_blanks(df))))
+    length = len(df)
+    df = clean_anomalies(df)
+    assert len(df) == length
+    for column in ANOMALIES:
+        assert df[column].dtype == "bool"
+    assert (df["Anomalies"] == df[ANOMALIES].sum(axis=1)).all()
+
+
+def test_clean_anomalies_flags():
+    ts = pd.Timestamp
+    df = pd.DataFrame(
+        {
+            "Name": ["A", "A", "B", "C"],
+            "Role": ["Main Store"] * 4,
+            "Payroll ID": [1, 1, 2, 3],
+            "Clock in datetime": [
+                ts("2022-02-15 12:00"),
+                ts("2022-02-15 08:00"),
+                ts("2022-02-15 17:00"),
+                ts("2022-02-15 08:00"),
+            ],
+            "Clock out datetime": [
+                ts("2022-02-15 16:00"),
+                ts("2022-02-15 13:00"),
+                ts("2022-02-15 09:00"),
+                ts("2022-02-15 15:00"),
+            ],
+            "Break start": [ts("2022-02-15 13:00"), pd.NaT, pd.NaT, ts("2022-02-15 16:00")],
+            "Break end": [ts("2022-02-15 13:30"), pd.NaT, pd.NaT, ts("2022-02-15 16:30")],
+            "Scheduled": [4000, 5000, 0, 7000],
+            "Actual vs. Scheduled": ["0.00", "0.00", "-8.00", "2.50"],
+            "Issues": ["", "", "", "Late"],
+        },
+        index=[10, 11, 12, 13],
+    )
+    df = clean_anomalies(df)
+    assert df["Overlapping shift"].tolist() == [True, True, False, False]
+    assert df["Clock out before clock in"].tolist() == [False, False, True, False]
+    assert df["Break outside shift"].tolist() == [False, False, False, True]
+    assert df["Missing break"].tolist() == [False, False, False, False]
+    assert df["Schedule delta"].tolist() == [False, False, False, True]
+    assert df["Reported issue"].tolist() == [False, False, False, True]
+    assert df["Anomalies"].tolist() == [1, 1, 1, 3]
+
+    report = anomaly_report(df)
+    assert report["counts"]["Overlapping shift"] == 2
+    assert report["counts"]["Missing break"] == 0
+    assert len(report["shifts"]) == 4
+    assert report["shifts"][3]["anomalies"] == [
+        "Break outside shift",
+        "Schedule delta",
+        "Reported issue",
+    ]
+
+
+def test_parse_batch(csv_1_path: Path):
+    data = csv_1_path.read_bytes()
+    single = parse_batch([("a.csv", data)])
+    batch = parse_batch([("a.csv", data), ("b.csv", data)])
+    assert batch.errors == []
+    assert batch.payroll_period == get_payroll_period(csv_1_path)
+    assert batch.size == 2 * single.size
+    assert [f.size for f in batch.files] == [single.size, single.size]
+
+
+def test_parse_batch_period_mismatch(csv_1_path: Path, csv_2_path: Path):
+    batch = parse_batch(
+        [("a.csv", csv_1_path.read_bytes()), ("b.csv", csv_2_path.read_bytes())]
+    )
+    assert batch.payroll_period is None
+    assert any(error.startswith("Payroll period mismatch") for error in batch.errors)
+    # Nothing is merged for a rejected batch
+    assert batch.df is None
+    assert batch.size == 0
+
+
+def test_engines_single_employee(csv_1_path: Path):
+    """
+    Without a repeated header row, currency columns are read as numbers by the default engine.
+    """
+    data = b"".join(csv_1_path.read_bytes().splitlines(keepends=True)[:12])
+    c = clean(read_file(BytesIO(data)))
+    arrow = clean(read_file(BytesIO(data), engine="pyarrow"))
+    for column in ("Wage", "Scheduled"):
+        assert c[column].tolist() == arrow[column].tolist()
+    assert c["Wage"].tolist() == [12320] * 7
+
+
+def test_parse_batch_overlap_across_files(csv_1_path: Path):
+    """
+    Shifts of one employee in two location exports of the same period must be checked together.
+    """
+    lines = csv_1_path.read_bytes().splitlines(keepends=True)
+    # Alicia Smith works 5:45am to 12:01pm on February 15 (the first shift of the file)
+    overlapping = lines[4].replace(b"5:45am", b"8:00am").replace(b"12:01pm", b"11:00am")
+    other_location = b"".join(lines[:4]) + overlapping + lines[11]
+    batch = parse_batch(
+        [("a.csv", csv_1_path.read_bytes()), ("b.csv", other_location)]
+    )
+    assert batch.errors == []
+    alicia = batch.df[
+        (batch.df["Name"] == "Alicia Smith")
+        & (batch.df["Clock in datetime"].dt.day == 15)
+    ]
+    assert len(alicia) == 2
+    assert alicia["Overlapping shift"].all()
+
+
+def test_parse_batch_zip(csv_1_path: Path, csv_2_path: Path):
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as archive:
+        archive.write(csv_1_path, csv_1_path.name)
+        archive.write(csv_2_path, csv_2_path.name)
+    batch = parse_batch([("period.zip", buffer.getvalue())])
+    assert [f.filename for f in batch.files] == [
+        f"period.zip/{csv_1_path.name}",
+        f"period.zip/{csv_2_path.name}",
+    ]
+    assert all(f.error is None for f in batch.files)
+
+
+def test_parse_batch_zip_too_large(csv_1_path: Path, monkeypatch):
+    monkeypatch.setattr(batch_module, "MAX_UPLOAD_BYTES", 1024)
+    buffer = BytesIO()
+    with ZipFile(buffer, "w") as archive:
+        archive.write(csv_1_path, csv_1_path.name)
+    batch = parse_batch([("period.zip", buffer.getvalue())])
+    assert len(batch.files) == 1
+    assert batch.files[0].error.startswith("UploadTooLarge")
+    assert batch.df is None
+
+
+@param("csv_path", [csv_1_path, csv_2_path])
+def test_read_file_arrow(csv_path: Path, request):
+    csv_path = request.getfixturevalue(csv_path.__name__)
+    columns = [
+        "Name",
+        "Payroll ID",
+        "Clock in datetime",
+        "Clock out datetime",
+        "Break start",
+        "Break end",
+        "Role",
+        "Wage",
+        "Scheduled",
+        "Issues",
+        "Employee Note",
+        "Manager Note",
+        "Break paid",
+    ]
+    df_c = clean(read_file(csv_path))
+    # Both a memory-mapped path and an in-memory buffer are supported
+    df_path = read_file(csv_path, engine="pyarrow")
+    df_buffer = read_file(BytesIO(csv_path.read_bytes()), engine="pyarrow")
+    assert isinstance(df_path["Name"].dtype, pd.ArrowDtype)
+    pd.testing.assert_frame_equal(df_path, df_buffer)
+    pd.testing.assert_frame_equal(clean(df_path)[columns], df_c[columns])
+
+
+@param("csv_path", [csv_1_path, csv_2_path])
+def test_preflight(csv_path: Path, request):
+    csv_path = request.getfixturevalue(csv_path.__name__)
+    # The upload starts after some bytes the caller already consumed
+    file = BytesIO(b"0123456789" + csv_path.read_bytes())
+    file.seek(10)
+    preflight(file)
+    # The file is rewound to where it started
+    assert file.tell() == 10
+
+
+@param(
+    "replace",
+    [
+        (b"Village Roaster", b"Other Vendor"),
+        (b"Payroll Period", b"Pay Period"),
+        (b"Manager Note", b"Manager Notes"),
+    ],
+)
+def test_preflight_rejects(csv_1_path: Path, replace: tuple[bytes, bytes]):
+    data = csv_1_path.read_bytes().replace(*replace, 1)
+    with raises(UploadRejected):
+        preflight(BytesIO(data))
+
+
+def test_preflight_rejects_truncated(csv_1_path: Path):
+    data = b"".join(csv_1_path.read_bytes().splitlines(keepends=True)[:2])
+    with raises(UploadRejected, match="truncated"):
+        preflight(BytesIO(data))
+
+
+def test_preflight_limits(csv_1_path: Path):
+    data = csv_1_path.read_bytes()
+    with raises(UploadTooLarge):
+        preflight(BytesIO(data), max_bytes=len(data) - 1)
+    with raises(UploadTooLarge):
+        preflight(BytesIO(data), max_rows=10)
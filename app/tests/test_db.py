@@ -1,18 +1,31 @@
+import os
+import sqlite3
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from pathlib import Path
+
 from fastapi.testclient import TestClient
 from requests import Response
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-from pytest import fixture
+from pytest import fixture, raises
+from sqlalchemy.exc import IntegrityError
 
+from app.csv.csv import ANOMALIES
+from app.database import archive
 from app.database.database import Base
+from app.database.name_index import NAME_INDEX, NameIndex
 from app.dependencies import get_db
+import app.main as main_module
 from app.main import app as main_app
 
 from app.models.roles import Role
 from app.models.locations import Location
 from app.models.employees import Employee
+from app.models.shifts import Shift
+from app.models.aggregates import PeriodAggregate
 
 # This is to remove import errors in PyCharm
 # It performs no other purpose
@@ -72,6 +85,31 @@ def role_url(db_url) -> str:
     return f"{db_url}/roles"
 
 
+@fixture
+def agg_url(db_url) -> str:
+    return f"{db_url}/aggregates"
+
+
+@fixture
+def shift_url(db_url) -> str:
+    return f"{db_url}/shifts"
+
+
+@fixture
+def payroll_url(db_url) -> str:
+    return f"{db_url}/payroll"
+
+
+@fixture
+def upload_url() -> str:
+    return "/upload"
+
+
+@fixture
+def csv_path() -> Path:
+    return Path(__file__).parent / "resources" / "csv" / "ts_feb_22.csv"
+
+
 @fixture
 def test_db():
     """
@@ -82,6 +120,7 @@ def test_db():
     Base.metadata.create_all(bind=engine)
     yield
     Base.metadata.drop_all(bind=engine)
+    NAME_INDEX.clear()
 
 
 @fixture
@@ -139,6 +178,17 @@ def fake_employee_2(emp_url, fake_location_2) -> Response:
     )
 
 
+@fixture
+def fake_upload(upload_url, csv_path, test_db) -> Response:
+    """
+    Uploads a timesheet export, and returns a TestClient response object.
+    """
+    with csv_path.open("rb") as file:
+        yield client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, file, "text/csv")}
+        )
+
+
 def test_create_location(loc_url, test_db):
     """
     Tests Location creation. Does NOT use fake_location_1 fixture.
@@ -247,3 +297,526 @@ def test_get_roles(role_url, fake_role):
     assert len(response.json()) == 1
     assert response.json()[0]["name"] == fake_role.json()["name"]
     assert response.json()[0]["location_id"] == fake_role.json()["location_id"]
+
+
+def test_upload_aggregates(agg_url, fake_upload):
+    """
+    Tests that an upload updates the aggregates. Uses fake_upload fixture.
+    """
+    assert fake_upload.status_code == 200
+    stored = fake_upload.json()["stored"]
+    assert stored > 0
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    response = client.get(f"{agg_url}/", params={"period_start": period_start})
+    assert response.status_code == 200
+    assert sum(cell["shifts"] for cell in response.json()) == stored
+    assert all(cell["minutes"] > 0 for cell in response.json())
+
+
+def test_upload_idempotent(agg_url, upload_url, csv_path, fake_upload):
+    """
+    Tests that uploading the same file twice does not count its shifts twice.
+    """
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    before = client.get(f"{agg_url}/", params={"period_start": period_start}).json()
+    with csv_path.open("rb") as file:
+        response = client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, file, "text/csv")}
+        )
+    assert response.json()["stored"] == 0
+    after = client.get(f"{agg_url}/", params={"period_start": period_start}).json()
+    assert after == before
+
+
+def test_rebuild_aggregates(agg_url, fake_upload):
+    """
+    Tests that rebuilding the aggregates from stored shifts gives the same cells.
+    """
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+
+    def cells():
+        response = client.get(f"{agg_url}/", params={"period_start": period_start})
+        return sorted(
+            (c["role"], c["day"], c["shifts"], c["minutes"], c["wages"])
+            for c in response.json()
+        )
+
+    before = cells()
+    response = client.post(f"{agg_url}/rebuild", params={"period_start": period_start})
+    assert response.status_code == 200
+    assert response.json()["cells"] == len(before)
+    assert cells() == before
+
+
+def test_name_index():
+    """
+    Tests fuzzy matching of timesheet names. Does not touch the database.
+    """
+    index = NameIndex()
+    index.add(1, "Alicia Smith")
+    index.add(2, "Angela Anderson")
+    assert index.match("alicia  SMITH") == (1, 1.0)
+    employee_id, score = index.match("Alicia Smyth")
+    assert employee_id == 1
+    assert 0.6 <= score < 1.0
+    assert index.match("Somebody Else").employee_id is None
+    # Renaming replaces the old name
+    index.add(1, "Alicia Jones")
+    assert index.match("Alicia Jones") == (1, 1.0)
+    assert index.match("Alicia Smith").score < 1.0
+
+
+def test_name_index_reloads_renames(emp_url, fake_location_1):
+    """
+    Tests that an index picks up renames made by another process, but not its own.
+    """
+    location_id = fake_location_1.json()["id"]
+    alicia = client.post(
+        f"{emp_url}/create",
+        json={"name": "Alicia Smyth", "primary_location_id": location_id},
+    ).json()
+    # Stands in for the index of another worker process
+    other = NameIndex()
+    db = TestingSessionLocal()
+    try:
+        assert other.resolve(db, ["Alicia Smith"])["Alicia Smith"].score < 1.0
+        NAME_INDEX.load(db)
+
+        client.post(
+            f"{emp_url}/update",
+            params={"employee_id": alicia["id"]},
+            json={"name": "Alicia Smith", "primary_location_id": location_id},
+        )
+        assert other.resolve(db, ["Alicia Smith"])["Alicia Smith"] == (alicia["id"], 1.0)
+        # The process that renamed the employee tracked its own change
+        state = NAME_INDEX.state
+        NAME_INDEX.load(db)
+        assert NAME_INDEX.state is state
+    finally:
+        db.close()
+
+
+def test_upload_matches_employees(emp_url, upload_url, csv_path, fake_location_1):
+    """
+    Tests that uploaded timesheet names resolve to employees, including misspellings.
+    """
+    location_id = fake_location_1.json()["id"]
+    alicia = client.post(
+        f"{emp_url}/create",
+        json={"name": "Alicia Smyth", "primary_location_id": location_id},
+    ).json()
+    with csv_path.open("rb") as file:
+        response = client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, file, "text/csv")}
+        )
+    employees = response.json()["employees"]
+    assert employees["Alicia Smith"]["employee_id"] == alicia["id"]
+    assert employees["Alicia Smith"]["score"] < 1.0
+    assert employees["Angela Anderson"]["employee_id"] is None
+
+
+def test_archive_period(shift_url, agg_url, fake_upload, tmp_path, monkeypatch):
+    """
+    Tests that archived periods are still read through the same API.
+    """
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    params = {"period_start": period_start}
+    shifts = client.get(f"{shift_url}/", params=params).json()
+    cells = client.get(f"{agg_url}/", params=params).json()
+
+    response = client.post(f"{shift_url}/archive", params={"before": "2100-01-01"})
+    assert response.status_code == 200
+    assert response.json() == {period_start: len(shifts)}
+    assert list(tmp_path.glob("period_start=*/location_id=*/*.parquet"))
+
+    # The live table is empty, reads are answered from the archive
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Shift).count() == 0
+    finally:
+        db.close()
+    archived = client.get(f"{shift_url}/", params=params).json()
+    assert sorted(s["id"] for s in archived) == sorted(s["id"] for s in shifts)
+
+    # Aggregates can still be rebuilt from the archive
+    client.post(f"{agg_url}/rebuild", params=params)
+    assert len(client.get(f"{agg_url}/", params=params).json()) == len(cells)
+
+
+def test_archive_period_keeps_late_uploads(shift_url, fake_upload, tmp_path, monkeypatch):
+    """
+    Tests that shifts uploaded while a period is being archived stay in the live table.
+    """
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    shifts = client.get(f"{shift_url}/", params={"period_start": period_start}).json()
+    write_table = pq.write_table
+
+    def late_upload(*args, **kwargs):
+        db = TestingSessionLocal()
+        try:
+            late = db.get(Shift, shifts[0]["id"])
+            db.add(
+                Shift(
+                    period_start=late.period_start,
+                    period_end=late.period_end,
+                    payroll_id=late.payroll_id,
+                    name=late.name,
+                    role=late.role,
+                    clock_in=late.clock_in + timedelta(days=1),
+                    clock_out=late.clock_out + timedelta(days=1),
+                    minutes=late.minutes,
+                    wages=late.wages,
+                )
+            )
+            db.commit()
+        finally:
+            db.close()
+        monkeypatch.setattr(pq, "write_table", write_table)
+        write_table(*args, **kwargs)
+
+    monkeypatch.setattr(pq, "write_table", late_upload)
+    response = client.post(f"{shift_url}/archive", params={"before": "2100-01-01"})
+    assert response.json() == {period_start: len(shifts)}
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Shift).count() == 1
+    finally:
+        db.close()
+
+
+def test_archived_shifts_follow_roles(
+    agg_url, role_url, shift_url, fake_upload, fake_location_1, fake_location_2, tmp_path, monkeypatch
+):
+    """
+    Tests that archived shifts are read with the location of their role as it is now.
+    """
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    location_1 = fake_location_1.json()["id"]
+    location_2 = fake_location_2.json()["id"]
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    role = client.post(
+        f"{role_url}/create", json={"name": "Hospital", "location_id": location_1}
+    ).json()
+    client.post(f"{shift_url}/archive", params={"before": "2100-01-01"})
+    client.post(
+        f"{role_url}/update",
+        params={"role_id": role["id"]},
+        json={"name": "Hospital", "location_id": location_2},
+    )
+
+    params = {"period_start": period_start}
+    shifts = client.get(f"{shift_url}/", params=params).json()
+    cells = client.get(f"{agg_url}/", params={**params, "role": "Hospital"}).json()
+    assert {s["location_id"] for s in shifts if s["role"] == "Hospital"} == {location_2}
+    assert {cell["location_id"] for cell in cells} == {location_2}
+
+
+def test_archive_then_rebuild_keeps_live_shifts(
+    agg_url, role_url, shift_url, upload_url, fake_upload, fake_location_1, tmp_path, monkeypatch
+):
+    """
+    Tests that rebuilding an archived period does not touch the live shifts of another period,
+    even though the live table was emptied by the archive.
+    """
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    archived_period = fake_upload.json()["payroll_period"][0][:10]
+    client.post(f"{shift_url}/archive", params={"before": "2100-01-01"})
+
+    csv_path = Path(__file__).parent / "resources" / "csv" / "ts_nov_21.csv"
+    with csv_path.open("rb") as file:
+        response = client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, file, "text/csv")}
+        )
+    live_period = response.json()["payroll_period"][0][:10]
+    client.post(
+        f"{role_url}/create",
+        json={"name": "Hospital", "location_id": fake_location_1.json()["id"]},
+    )
+    live = client.get(f"{shift_url}/", params={"period_start": live_period}).json()
+    archived = client.get(f"{shift_url}/", params={"period_start": archived_period}).json()
+    # Archived ids are never handed out again
+    assert not {shift["id"] for shift in live} & {shift["id"] for shift in archived}
+
+    client.post(f"{agg_url}/rebuild", params={"period_start": archived_period})
+    after = client.get(f"{shift_url}/", params={"period_start": live_period}).json()
+    assert {shift["id"]: shift["location_id"] for shift in after} == {
+        shift["id"]: shift["location_id"] for shift in live
+    }
+
+
+def test_archive_period_write_fails(shift_url, fake_upload, tmp_path, monkeypatch):
+    """
+    Tests that a failed archive leaves the live shifts and no partial files behind.
+    """
+    import pyarrow.parquet as pq
+
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path)
+    period_start = date.fromisoformat(fake_upload.json()["payroll_period"][0][:10])
+
+    def failing_write(table, where, **kwargs):
+        Path(where).write_bytes(b"partial")
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(pq, "write_table", failing_write)
+    db = TestingSessionLocal()
+    try:
+        count = db.query(Shift).count()
+        with raises(OSError):
+            archive.archive_period(db, period_start)
+        assert db.query(Shift).count() == count
+    finally:
+        db.close()
+    assert not [path for path in tmp_path.rglob("*") if path.is_file()]
+
+
+def test_payroll_recompute(
+    emp_url,
+    role_url,
+    agg_url,
+    shift_url,
+    payroll_url,
+    upload_url,
+    csv_path,
+    fake_location_1,
+    fake_location_2,
+):
+    """
+    Tests that payroll totals, shift locations and aggregates follow a role moving
+    to another location, and an employee moving to another primary location.
+    """
+    location_1 = fake_location_1.json()["id"]
+    location_2 = fake_location_2.json()["id"]
+    role = client.post(
+        f"{role_url}/create", json={"name": "Hospital", "location_id": location_1}
+    ).json()
+    # Shifts with an unknown role ("Main Store") count towards the primary location
+    alicia = client.post(
+        f"{emp_url}/create",
+        json={"name": "Alicia Smith", "primary_location_id": location_2},
+    ).json()
+    with csv_path.open("rb") as file:
+        response = client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, file, "text/csv")}
+        )
+    period_start = response.json()["payroll_period"][0][:10]
+
+    def totals():
+        response = client.get(
+            f"{payroll_url}/",
+            params={"period_start": period_start, "employee_id": alicia["id"]},
+        )
+        return {total["location_id"]: total["minutes"] for total in response.json()}
+
+    def cells():
+        response = client.get(f"{agg_url}/", params={"period_start": period_start})
+        return sorted(
+            (cell["location_id"] or 0, cell["role"], cell["day"], cell["minutes"])
+            for cell in response.json()
+        )
+
+    def locations():
+        response = client.get(f"{shift_url}/", params={"period_start": period_start})
+        return {
+            (shift["role"], shift["location_id"])
+            for shift in response.json()
+            if shift["employee_id"] == alicia["id"]
+        }
+
+    def rebuilt():
+        # Rebuilding from scratch gives the same cells as the incremental updates
+        current = cells()
+        client.post(f"{agg_url}/rebuild", params={"period_start": period_start})
+        return current == cells()
+
+    before = totals()
+    assert set(before) == {location_1, location_2}
+    assert locations() == {("Hospital", location_1), ("Main Store", location_2)}
+
+    client.post(
+        f"{role_url}/update",
+        params={"role_id": role["id"]},
+        json={"name": "Hospital", "location_id": location_2},
+    )
+    assert totals() == {location_2: sum(before.values())}
+    assert locations() == {("Hospital", location_2), ("Main Store", location_2)}
+    assert rebuilt()
+
+    client.post(
+        f"{emp_url}/update",
+        params={"employee_id": alicia["id"]},
+        json={"name": "Alicia Smith", "primary_location_id": location_1},
+    )
+    assert totals() == {
+        location_1: before[location_2],
+        location_2: before[location_1],
+    }
+    assert locations() == {("Hospital", location_2), ("Main Store", location_1)}
+    assert rebuilt()
+
+
+def test_upload_many_shifts(upload_url, csv_path, test_db):
+    """
+    Tests an upload with more shifts than SQLite allows query parameters for a single IN list.
+    """
+    lines = csv_path.read_bytes().splitlines(keepends=True)
+    # Alicia Smith's first shift, repeated under as many payroll ids
+    row = lines[4].split(b",")
+    rows = [b",".join(row[:9] + [str(i).encode()] + row[10:]) for i in range(20_000)]
+    data = b"".join(lines[:4] + rows)
+    # Some builds raise the limit, so the stock SQLite one is set on the test connection
+    raw = engine.raw_connection()
+    connection = raw.connection
+    limit = connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 32766)
+    try:
+        response = client.post(
+            f"{upload_url}/", files={"file": (csv_path.name, data, "text/csv")}
+        )
+    finally:
+        connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        raw.close()
+    assert response.status_code == 200
+    assert response.json()["stored"] == 20_000
+
+
+def test_upload_batch_replaces_broken_pool(upload_url, csv_path, test_db, monkeypatch):
+    """
+    Tests that a worker dying does not break batch uploads for the rest of the app's lifetime.
+    """
+    lines = csv_path.read_bytes().splitlines(keepends=True)
+    # Two location exports of the same period
+    files = [
+        ("files", ("a.csv", b"".join(lines[:12]), "text/csv")),
+        ("files", ("b.csv", b"".join(lines[:4] + lines[12:]), "text/csv")),
+    ]
+    # The context manager runs the lifespan, which creates the shared pool.
+    # Its database setup would touch the production database, the test one is already set up.
+    monkeypatch.setattr(main_module, "init_db", lambda: None)
+    with TestClient(app) as lifespan_client:
+        broken = app.state.parse_pool
+        with raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+
+        response = lifespan_client.post(f"{upload_url}/batch", files=files)
+        assert response.status_code == 200
+        assert response.json()["errors"] == []
+        assert response.json()["stored"] > 0
+        assert app.state.parse_pool is not broken
+
+
+def test_upload_single_employee(shift_url, upload_url, csv_path, test_db):
+    """
+    Tests uploading an export of one employee, whose currency columns are read as numbers.
+    """
+    # The preamble, Alicia Smith's shifts and their totals row
+    data = b"".join(csv_path.read_bytes().splitlines(keepends=True)[:12])
+    response = client.post(
+        f"{upload_url}/", files={"file": (csv_path.name, data, "text/csv")}
+    )
+    assert response.status_code == 200
+    assert response.json()["stored"] == 7
+    period_start = response.json()["payroll_period"][0][:10]
+    shifts = client.get(f"{shift_url}/", params={"period_start": period_start}).json()
+    assert {shift["wage"] for shift in shifts} == {12320}
+    assert sorted(shift["scheduled"] for shift in shifts)[-1] == 6250
+
+
+def test_role_update_relocates_unmatched_names(
+    agg_url, role_url, shift_url, fake_upload, fake_location_1, fake_location_2
+):
+    """
+    Tests that shifts and aggregates follow a role moving to another location
+    when no timesheet name matched an employee, so there are no payroll results.
+    """
+    location_1 = fake_location_1.json()["id"]
+    location_2 = fake_location_2.json()["id"]
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+
+    def locations():
+        params = {"period_start": period_start}
+        shifts = client.get(f"{shift_url}/", params=params).json()
+        cells = client.get(f"{agg_url}/", params={**params, "role": "Hospital"}).json()
+        return (
+            {shift["location_id"] for shift in shifts if shift["role"] == "Hospital"},
+            {cell["location_id"] for cell in cells},
+        )
+
+    role = client.post(
+        f"{role_url}/create", json={"name": "Hospital", "location_id": location_1}
+    ).json()
+    assert locations() == ({location_1}, {location_1})
+    client.post(
+        f"{role_url}/update",
+        params={"role_id": role["id"]},
+        json={"name": "Hospital", "location_id": location_2},
+    )
+    assert locations() == ({location_2}, {location_2})
+
+
+def test_upload_arrow_engine(upload_url, csv_path, test_db):
+    """
+    Tests uploading with the pyarrow ingestion engine.
+    """
+    with csv_path.open("rb") as file:
+        response = client.post(
+            f"{upload_url}/",
+            params={"engine": "pyarrow"},
+            files={"file": (csv_path.name, file, "text/csv")},
+        )
+    assert response.status_code == 200
+    assert response.json()["stored"] > 0
+
+
+def test_upload_anomalies(fake_upload):
+    """
+    Tests that an upload reports the flagged shifts alongside the count of each check.
+    """
+    anomalies = fake_upload.json()["anomalies"]
+    assert set(anomalies["counts"]) == set(ANOMALIES)
+    flagged = anomalies["shifts"]
+    assert flagged
+    for check, count in anomalies["counts"].items():
+        assert count == sum(check in shift["anomalies"] for shift in flagged)
+
+
+def test_rebuild_aggregates_relocates(agg_url, role_url, shift_url, fake_upload, fake_location_1):
+    """
+    Tests that a rebuild assigns locations from roles created after the upload.
+    """
+    location_id = fake_location_1.json()["id"]
+    period_start = fake_upload.json()["payroll_period"][0][:10]
+    params = {"period_start": period_start, "role": "Main Store"}
+    cells = client.get(f"{agg_url}/", params=params).json()
+    assert cells and all(cell["location_id"] is None for cell in cells)
+
+    client.post(
+        f"{role_url}/create", json={"name": "Main Store", "location_id": location_id}
+    )
+    client.post(f"{agg_url}/rebuild", params={"period_start": period_start})
+    cells = client.get(f"{agg_url}/", params=params).json()
+    assert cells and all(cell["location_id"] == location_id for cell in cells)
+    shifts = client.get(f"{shift_url}/", params={"period_start": period_start}).json()
+    assert all(
+        shift["location_id"] == location_id
+        for shift in shifts
+        if shift["role"] == "Main Store"
+    )
+
+
+def test_aggregate_cell_unique_without_location(test_db):
+    """
+    Tests that the cell index holds for cells without a location.
+    """
+    cell = {"period_start": date(2022, 2, 11), "role": "x", "day": date(2022, 2, 11)}
+    db = TestingSessionLocal()
+    try:
+        db.add_all([PeriodAggregate(**cell), PeriodAggregate(**cell)])
+        with raises(IntegrityError):
+            db.commit()
+    finally:
+        db.close()
@@ -1,6 +1,11 @@
+import subprocess
+import sys
+from pathlib import Path
+
 from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
 
-from app.main import app
+from app.main import app, init_db
 
 client = TestClient(app)
 
@@ -9,3 +14,39 @@ def test_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Hello World"}
+
+
+def test_lazy_imports():
+    """
+    Importing the app must not import the CSV subsystem (and pandas with it).
+    Runs in a fresh interpreter, as other tests import pandas.
+    """
+    code = "import sys, app.main; print('pandas' in sys.modules, 'app.csv.csv' in sys.modules)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).parent.parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_init_db_adds_columns(tmp_path: Path):
+    """
+    Databases created before a column was added get it on startup.
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite3'}")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE employees (id INTEGER PRIMARY KEY, name VARCHAR, "
+                "primary_location_id INTEGER)"
+            )
+        )
+        connection.execute(text("INSERT INTO employees (name) VALUES ('Alicia Smith')"))
+    init_db(engine)
+    # Running again on an up to date database is a no-op
+    init_db(engine)
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT version FROM employees")).scalar() == 0
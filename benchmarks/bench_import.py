@@ -0,0 +1,84 @@
+"""
+Checks the cold import time of app.main against a budget, using python -X importtime.
+Also checks that the heavy CSV dependencies are not imported at startup.
+Exits with a non-zero status when either check fails.
+
+The budget applies to the app's own share of the import: the cumulative time of app.main
+minus the frameworks it cannot start without (FRAMEWORK_MODULES), which the app does not control
+and which alone vary by hundreds of milliseconds between machines. The median of several
+cold imports is used, as a single one is noisy.
+
+Usage: python -m benchmarks.bench_import [--budget MS] [--runs N] [--top N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+# Imported by app.main but not counted against the budget
+FRAMEWORK_MODULES = ["fastapi", "sqlalchemy"]
+# Import time allowed for the app's own share of app.main, in milliseconds.
+# The app's share measured about 700 ms before the CSV subsystem was deferred (pandas alone
+# is about 450 ms) and about 210 ms after, while fastapi and sqlalchemy take about 600 ms.
+# The budget leaves room for slower machines, and is exceeded if pandas is imported again.
+IMPORT_BUDGET_MS = 400
+# Modules that must only be imported on first use of the CSV subsystem
+DEFERRED_MODULES = ["pandas", "numpy", "pyarrow", "app.csv.csv"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """
+    Imports a module in a fresh interpreter.
+    Returns the cumulative import time, in microseconds, of every module it imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    # Lines look like: "import time:       123 |       4567 |   package.module"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [import_times("app.main") for _ in range(args.runs)]
+    total_ms = statistics.median(times["app.main"] for times in runs) / 1000
+    framework_ms = statistics.median(
+        sum(times.get(name, 0) for name in FRAMEWORK_MODULES) for times in runs
+    ) / 1000
+    own_ms = total_ms - framework_ms
+    print(
+        f"app.main: {total_ms:.1f} ms, of which {', '.join(FRAMEWORK_MODULES)}: "
+        f"{framework_ms:.1f} ms, app: {own_ms:.1f} ms (budget {args.budget:.0f} ms)"
+    )
+    times = runs[0]
+    print("Slowest imports (cumulative, first run):")
+    for name, us in sorted(times.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    eager = [name for name in DEFERRED_MODULES if name in times]
+    if eager:
+        print(f"FAIL: imported at startup: {', '.join(eager)}")
+    if own_ms > args.budget:
+        print("FAIL: over budget")
+    sys.exit(1 if eager or own_ms > args.budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compares the pandas C engine and the pyarrow engine of read_file()
+on a large synthetic upload held in a SpooledTemporaryFile, as FastAPI does.
+
+Usage: python -m benchmarks.bench_ingest [--copies N] [--repeat N]
+"""
+import argparse
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from timeit import repeat
+
+from app.csv.csv import read_file
+
+FIXTURE = Path(__file__).parent.parent / "app/tests/resources/csv/ts_feb_22.csv"
+# Starlette rolls uploads over to disk after 1 MB
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def make_upload(copies: int) -> SpooledTemporaryFile:
+    """
+    Builds an upload of the fixture preamble followed by its body repeated `copies` times.
+    """
+    lines = FIXTURE.read_bytes().splitlines(keepends=True)
+    preamble, body = b"".join(lines[:4]), b"".join(lines[4:])
+    upload = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    upload.write(preamble)
+    for _ in range(copies):
+        upload.write(body)
+    upload.seek(0)
+    return upload
+
+
+def bench(upload: SpooledTemporaryFile, engine: str, repeats: int) -> float:
+    def run():
+        upload.seek(0)
+        read_file(upload, engine=engine)
+
+    return min(repeat(run, number=1, repeat=repeats))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    upload = make_upload(args.copies)
+    size = upload.seek(0, 2)
+    print(f"Upload: {size / 1024 / 1024:.1f} MB, rolled to disk: {upload._rolled}")
+    timings = {engine: bench(upload, engine, args.repeat) for engine in ("c", "pyarrow")}
+    for engine, seconds in timings.items():
+        print(f"{engine:>8}: {seconds * 1000:8.1f} ms")
+    print(f" speedup: {timings['c'] / timings['pyarrow']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
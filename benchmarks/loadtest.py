@@ -0,0 +1,382 @@
+"""
+End-to-end load test: starts app.main:app under uvicorn against a temporary database,
+then drives a weighted mix of /db/* reads and writes and /upload/ posts
+from an async client, at one or more concurrency levels.
+Reports latency percentiles, throughput, error rate and server CPU/RSS per level.
+
+Usage: python -m benchmarks.loadtest [--concurrency 1,8,32] [--duration 10]
+                                     [--mix employees=4,roles=2,locations=2,create=1,upload=1]
+
+Requires httpx and uvicorn. Server CPU/RSS is reported if psutil is installed.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+ROOT = Path(__file__).parent.parent
+DEFAULT_MIX = "employees=4,roles=2,locations=2,create=1,upload=1"
+# Header of a timesheet export, see app.csv.preflight.COLUMNS
+HEADER = [
+    "Name",
+    "Clock in date",
+    "Clock in time",
+    "Clock out date",
+    "Clock out time",
+    "Break start",
+    "Break end",
+    "Break length",
+    "Break type",
+    "Payroll ID",
+    "Role",
+    "Wage",
+    "Issues",
+    "Scheduled",
+    "Actual vs. Scheduled",
+    "Total Paid",
+    "Regular",
+    "Unpaid Breaks",
+    "Est. Overtime",
+    "Est. Wages",
+    "Cash Tips",
+    "No Show Reason",
+    "Employee Note",
+    "Manager Note",
+]
+ROLES = ["Main Store", "Hospital"]
+
+_unique = itertools.count()
+
+
+def make_timesheet(employees: int = 20, period_start: date | None = None) -> bytes:
+    """
+    Generates a timesheet export in the Village Roaster format, with random shifts.
+    """
+    period_start = period_start or date(2022, 1, 1) + timedelta(
+        days=14 * random.randrange(500)
+    )
+    period_end = period_start + timedelta(days=13)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(["Village Roaster"] + [""] * 23)
+    writer.writerow(
+        ["Payroll Period", f"{period_start:%m/%d/%Y} To {period_end:%m/%d/%Y}"]
+        + [""] * 22
+    )
+    writer.writerow([""] * 24)
+    for payroll_id in range(1, employees + 1):
+        name = f"Employee {payroll_id}"
+        writer.writerow(HEADER)
+        for day in random.sample(range(14), 8):
+            clock_in = datetime.combine(
+                period_start + timedelta(days=day), datetime.min.time()
+            ) + timedelta(hours=6, minutes=random.randrange(180))
+            clock_out = clock_in + timedelta(minutes=random.randrange(240, 540))
+            break_start = clock_in + timedelta(hours=3)
+            break_end = break_start + timedelta(minutes=30)
+            writer.writerow(
+                [
+                    name,
+                    _date(clock_in),
+                    _time(clock_in),
+                    _date(clock_out),
+                    _time(clock_out),
+                    _time(break_start),
+                    _time(break_end),
+                    "30 min",
+                    "30 min - Unpaid",
+                    payroll_id,
+                    random.choice(ROLES),
+                    "$12.32",
+                    "",
+                    "6.00",
+                    "0.00",
+                    "6.00",
+                    "6.00",
+                    "0.50",
+                    "0.00",
+                    "$73.92",
+                    "$0.00",
+                    "",
+                    "",
+                    "",
+                ]
+            )
+        writer.writerow([f"Totals for {name}"] + [""] * 23)
+    return out.getvalue().encode()
+
+
+def _date(value: datetime) -> str:
+    return f"{value:%B} {value.day} {value.year}"
+
+
+def _time(value: datetime) -> str:
+    return f"{value.hour % 12 or 12}:{value:%M}{value:%p}".lower()
+
+
+# Operations: each performs one request and returns the response
+async def get_employees(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/db/employees/")
+
+
+async def get_roles(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/db/roles/")
+
+
+async def get_locations(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.get("/db/locations/")
+
+
+async def create_employee(client: httpx.AsyncClient) -> httpx.Response:
+    return await client.post(
+        "/db/employees/create",
+        json={"name": f"Load Test {os.getpid()}-{next(_unique)}", "primary_location_id": 1},
+    )
+
+
+async def upload(client: httpx.AsyncClient) -> httpx.Response:
+    files = {"file": ("timesheet.csv", make_timesheet(), "text/csv")}
+    return await client.post("/upload/", files=files)
+
+
+OPERATIONS = {
+    "employees": get_employees,
+    "roles": get_roles,
+    "locations": get_locations,
+    "create": create_employee,
+    "upload": upload,
+}
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r}, choose from {list(OPERATIONS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir: Path, port: int, workers: int) -> subprocess.Popen:
+    """
+    Starts uvicorn in a temporary working directory, so the SQLite database
+    (./sql_app.sqlite3) and the archive (./archive) are created there.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise SystemExit("Server did not start")
+
+
+async def seed(client: httpx.AsyncClient):
+    """
+    Creates the locations, roles and employees the reads and uploads refer to.
+    """
+    for slug in ("main-store", "hospital"):
+        await client.post("/db/locations/create", json={"slug": slug})
+    for location_id, role in enumerate(ROLES, start=1):
+        await client.post(
+            "/db/roles/create", json={"name": role, "location_id": location_id}
+        )
+    for payroll_id in range(1, 21):
+        await client.post(
+            "/db/employees/create",
+            json={"name": f"Employee {payroll_id}", "primary_location_id": 1},
+        )
+
+
+class ResourceSampler:
+    """
+    Samples CPU and RSS of the server process and its workers while a level runs.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.interval = interval
+        self.cpu: list[float] = []
+        self.rss: list[int] = []
+        self.process = psutil.Process(pid) if psutil else None
+
+    def _processes(self):
+        return [self.process] + self.process.children(recursive=True)
+
+    async def run(self):
+        if self.process is None:
+            return
+        for process in self._processes():
+            process.cpu_percent()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, rss = 0.0, 0
+            for process in self._processes():
+                try:
+                    cpu += process.cpu_percent()
+                    rss += process.memory_info().rss
+                except psutil.NoSuchProcess:
+                    pass
+            self.cpu.append(cpu)
+            self.rss.append(rss)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def run_level(
+    base_url: str, concurrency: int, duration: float, weights: dict[str, int], pid: int
+) -> dict:
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    names, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+    deadline = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        while time.monotonic() < deadline:
+            name = random.choices(names, cum_weights=cumulative)[0]
+            start = time.perf_counter()
+            try:
+                response = await OPERATIONS[name](client)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies[name].append(time.perf_counter() - start)
+            errors[name] += failed
+
+    sampler = ResourceSampler(pid)
+    sampling = asyncio.create_task(sampler.run())
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    sampling.cancel()
+
+    everything = [latency for values in latencies.values() for latency in values]
+    report = {
+        "concurrency": concurrency,
+        "requests": len(everything),
+        "throughput": len(everything) / elapsed,
+        "error_rate": sum(errors.values()) / max(len(everything), 1),
+        "operations": {},
+    }
+    for name, values in [("all", everything)] + sorted(latencies.items()):
+        report["operations"][name] = {
+            "requests": len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "errors": sum(errors.values()) if name == "all" else errors[name],
+        }
+    if sampler.cpu:
+        report["cpu_percent_avg"] = sum(sampler.cpu) / len(sampler.cpu)
+        report["rss_mb_max"] = max(sampler.rss) / 1024 / 1024
+    return report
+
+
+def print_report(report: dict):
+    print(
+        f"\nconcurrency {report['concurrency']}: {report['requests']} requests, "
+        f"{report['throughput']:.1f} req/s, {report['error_rate']:.2%} errors"
+    )
+    if "cpu_percent_avg" in report:
+        print(
+            f"server: {report['cpu_percent_avg']:.0f}% CPU avg, "
+            f"{report['rss_mb_max']:.0f} MB RSS max"
+        )
+    print(f"{'operation':>10} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, stats in report["operations"].items():
+        print(
+            f"{name:>10} {stats['requests']:>9} {stats['p50_ms']:>9.1f} "
+            f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['errors']:>7}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per level")
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--json", type=Path, help="Also write the reports to this file")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(Path(workdir), port, args.workers)
+        try:
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                await wait_ready(client)
+                await seed(client)
+            reports = []
+            for concurrency in map(int, args.concurrency.split(",")):
+                report = await run_level(
+                    base_url, concurrency, args.duration, weights, server.pid
+                )
+                print_report(report)
+                reports.append(report)
+        finally:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        args.json.write_text(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())